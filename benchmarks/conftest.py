@@ -0,0 +1,65 @@
+"""
+Offline benchmarks for snagsby, run with `make bench`.
+
+AWS is stood in for by botocore's Stubber. Every stubbed request sleeps for
+SNAGSBY_BENCH_LATENCY milliseconds (20 by default) to mimic a round trip.
+"""
+from __future__ import absolute_import
+
+import io
+import json
+import os
+import time
+
+import pytest
+
+from snagsby import sources
+
+LATENCY = float(os.environ.get('SNAGSBY_BENCH_LATENCY', 20)) / 1000
+
+
+def make_config(size):
+    return dict(
+        ('key_{}'.format(i), 'value {}'.format(i) if i % 3 else i)
+        for i in range(size)
+    )
+
+
+class StubbedS3(object):
+    """
+    A stubbed S3 client serving the same JSON body for every get_object.
+    """
+
+    def __init__(self, body, latency=LATENCY):
+        from botocore.stub import Stubber
+
+        self.body = body
+        self.latency = latency
+        self.client = sources.get_session(
+            region_name='us-east-1').client('s3')
+        self.stubber = Stubber(self.client)
+        self.stubber.activate()
+        # Registered after the stubber so it runs before the stubbed response
+        self.client.meta.events.register_first('before-call.*.*', self._sleep)
+
+    def _sleep(self, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def add_responses(self, count):
+        from botocore.response import StreamingBody
+
+        for _ in range(count):
+            self.stubber.add_response('get_object', {
+                'Body': StreamingBody(io.BytesIO(self.body), len(self.body)),
+            })
+
+
+@pytest.fixture
+def stubbed_s3(monkeypatch):
+    stub = StubbedS3(json.dumps(make_config(50)).encode())
+    monkeypatch.setattr(
+        sources.S3Source, 'get_client', lambda self, service: stub.client)
+    yield stub
+    stub.stubber.deactivate()
+    sources.etag_cache.clear()
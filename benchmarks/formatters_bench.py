@@ -0,0 +1,15 @@
+from __future__ import absolute_import
+
+import pytest
+
+from snagsby.formatters import EnvFormatter, JsonFormatter
+from snagsby.sources import sanitize
+
+from .conftest import make_config
+
+
+@pytest.mark.parametrize('formatter', [EnvFormatter, JsonFormatter])
+@pytest.mark.parametrize('size', [1000, 100000])
+def test_formatter_output(benchmark, formatter, size):
+    data = sanitize(make_config(size))
+    benchmark(lambda: formatter(data).get_output())
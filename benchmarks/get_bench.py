@@ -0,0 +1,35 @@
+from __future__ import absolute_import
+
+import pytest
+
+import snagsby
+
+
+@pytest.mark.parametrize('count', [1, 10, 100])
+def test_get(benchmark, stubbed_s3, count):
+    source = ' '.join(
+        's3://bucket/config-{}.json'.format(i) for i in range(count))
+
+    def setup():
+        stubbed_s3.add_responses(count)
+
+    out = benchmark.pedantic(
+        snagsby.get, args=(source,), setup=setup, rounds=5)
+    assert len(out) == 50
+
+
+@pytest.mark.parametrize('count', [10, 100])
+def test_get_sequential(benchmark, stubbed_s3, count):
+    source = ' '.join(
+        's3://bucket/config-{}.json'.format(i) for i in range(count))
+
+    def setup():
+        stubbed_s3.add_responses(count)
+
+    benchmark.pedantic(
+        snagsby.get,
+        args=(source,),
+        kwargs={'max_workers': 1},
+        setup=setup,
+        rounds=3,
+    )
@@ -0,0 +1,22 @@
+from __future__ import absolute_import
+
+import subprocess
+import sys
+
+
+def _run(code):
+    subprocess.check_call([sys.executable, '-c', code])
+
+
+def test_interpreter_startup(benchmark):
+    # Baseline to subtract from the import benchmarks
+    benchmark.pedantic(_run, args=('pass',), rounds=10)
+
+
+def test_import_snagsby(benchmark):
+    benchmark.pedantic(_run, args=('import snagsby',), rounds=10)
+
+
+def test_import_snagsby_and_boto3(benchmark):
+    benchmark.pedantic(
+        _run, args=('import snagsby, boto3',), rounds=10)
@@ -0,0 +1,55 @@
+from __future__ import absolute_import
+
+import pytest
+
+from snagsby.keys import KEY_REGEX, KeyPolicy
+from snagsby.sources import sanitize
+
+from .conftest import make_config
+
+
+def legacy_sanitize(obj):
+    """
+    sanitize() as it was before key policies, for comparison.
+    """
+    out = {}
+
+    if not type(obj) is dict:
+        return out
+
+    for k, v in obj.items():
+        k = k.upper()
+
+        item_is_invalid = (
+            not KEY_REGEX.match(k)
+            or type(v) is dict
+            or k == 'SNAGSBY_SOURCE'
+        )
+        if item_is_invalid:
+            continue
+
+        if type(v) is bool:
+            out[k] = "1" if v else "0"
+        else:
+            out[k] = str(v)
+
+    return out
+
+
+@pytest.mark.parametrize('size', [10, 1000, 100000])
+def test_sanitize(benchmark, size):
+    config = make_config(size)
+    out = benchmark(sanitize, config)
+    assert len(out) == size
+
+
+@pytest.mark.parametrize('size', [10, 1000, 100000])
+def test_legacy_sanitize(benchmark, size):
+    config = make_config(size)
+    out = benchmark(legacy_sanitize, config)
+    assert out == sanitize(config)
+
+
+def test_sanitize_cold_memo(benchmark):
+    config = make_config(100000)
+    benchmark(lambda: sanitize(config, KeyPolicy()))
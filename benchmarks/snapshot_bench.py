@@ -0,0 +1,29 @@
+from __future__ import absolute_import
+
+import pytest
+
+from snagsby.snapshot import Snapshot, write_snapshot
+from snagsby.sources import sanitize
+
+from .conftest import make_config
+
+
+@pytest.fixture(params=[1000, 100000])
+def snapshot_path(request, tmpdir):
+    path = str(tmpdir.join('config.snap'))
+    write_snapshot(path, sanitize(make_config(request.param)))
+    return path
+
+
+def test_snapshot_lookup(benchmark, snapshot_path):
+    def lookup():
+        with Snapshot(snapshot_path) as snapshot:
+            return snapshot['KEY_500']
+    benchmark(lookup)
+
+
+def test_snapshot_load(benchmark, snapshot_path):
+    def load():
+        with Snapshot(snapshot_path) as snapshot:
+            return dict(snapshot.iter_items())
+    benchmark(load)
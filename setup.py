@@ -19,6 +19,7 @@ with open('./snagsby/version.py') as f:
 
 requirements = [
     'boto3>=1.7',
+    'futures>=3.0; python_version < "3.0"',
 ]
 
 test_requirements = [
@@ -42,6 +43,11 @@ setup(
     package_dir={'snagsby': 'snagsby'},
     include_package_data=True,
     install_requires=requirements,
+    extras_require={
+        'encryption': ['cryptography'],
+        'streaming': ['ijson>=3.1'],
+        'zstd': ['zstandard'],
+    },
     license="MIT",
     zip_safe=True,
     keywords='snagsby',
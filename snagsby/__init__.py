@@ -1,37 +1,189 @@
 from __future__ import absolute_import
 
 import os
+import time
+from collections import OrderedDict
 
+from . import instrumentation
+from .diff import update
+from .exceptions import SourceError
+from .fetch import fetch_all, merge
 from .sources import parse_sources, sanitize
 from .version import __version__  # noqa
 
 
-def load(source=None, dest=None):
+def load(source=None, dest=None, max_workers=None, options=None, cache=None,
+         deadline=None, hedge=False, prune=False, sidecar=None,
+         resilience=None, raise_errors=False, key_policy=None):
+    """
+    Loads the sources into dest, os.environ by default, only writing keys
+    whose value changed. With ``prune``, keys set by the previous pruning
+    load into dest that are no longer in the sources are removed. Returns a
+    snagsby.diff.Diff of the added, changed, removed and unchanged keys.
+    """
     # Default to loading into the environment
     if dest is None:
         dest = os.environ
 
-    for k, v in get(source).items():
-        dest[k] = v
+    data = get(
+        source,
+        max_workers=max_workers,
+        options=options,
+        cache=cache,
+        deadline=deadline,
+        hedge=hedge,
+        sidecar=sidecar,
+        resilience=resilience,
+        raise_errors=raise_errors,
+        key_policy=key_policy,
+    )
+    return update(dest, data, prune=prune)
 
 
-def get(source=None):
-    out = {}
+def get(source=None, max_workers=None, options=None, cache=None,
+        deadline=None, hedge=False, sidecar=None, resilience=None,
+        raise_errors=False, key_policy=None):
+    """
+    Fetches and merges every source. ``options`` are default source options
+    (region, profile, botocore client settings...) which can be overridden by
+    the query string of each source url. ``cache`` is an optional
+    snagsby.cache.FileCache serving fresh entries without any AWS call.
 
+    ``deadline`` bounds the total time spent fetching, in seconds: failed
+    fetches are retried with backoff, ``hedge`` fires duplicate requests for
+    stragglers, and snagsby.exceptions.DeadlineExceededError is raised for
+    sources that didn't complete in time.
+
+    ``sidecar`` is the unix socket of a ``snagsby serve`` daemon to read the
+    sources from, falling back to fetching them when it is unavailable. It
+    defaults to the SNAGSBY_SIDECAR environment variable, False disables it.
+
+    ``resilience`` serves the last good result of sources while refreshing
+    them in the background, and stops calling failing sources for a while.
+    True uses the process wide snagsby.resilience.resilience, or pass a
+    snagsby.resilience.Resilience.
+
+    Sources like SMSource return no data when a request fails. With
+    ``raise_errors``, snagsby.exceptions.SourceError is raised instead of
+    returning their data merged with the other sources.
+
+    ``key_policy`` is a snagsby.keys.KeyPolicy sanitizing the keys of every
+    source, the default one if None. The sidecar, which uses the default
+    policy, isn't used with a custom one.
+    """
+    out, results = _get(
+        source,
+        max_workers=max_workers,
+        options=options,
+        cache=cache,
+        deadline=deadline,
+        hedge=hedge,
+        sidecar=sidecar,
+        resilience=resilience,
+        key_policy=key_policy,
+    )
+    errors = OrderedDict(
+        (url, error) for url, _, error in results if error is not None)
+    if raise_errors and errors:
+        raise SourceError(errors)
+    return out
+
+
+def _get(source=None, max_workers=None, options=None, cache=None,
+         deadline=None, hedge=False, sidecar=None, resilience=None,
+         key_policy=None):
+    """
+    Fetches and merges every source like get(), returning the merged data and
+    the (url, data, error) result of each source. The sidecar returns a
+    single result for every source.
+    """
+    start = time.time()
     if source is None:
         source = os.environ.get('SNAGSBY_SOURCE', '')
+    if sidecar is None:
+        sidecar = os.environ.get('SNAGSBY_SIDECAR')
 
-    parsed_sources = parse_sources(source)
+    parsed_sources = parse_sources(
+        source, defaults=options, key_policy=key_policy)
+    if resilience is True:
+        from .resilience import resilience
 
-    for parsed_source in parsed_sources:
-        for k, v in parsed_source.get_data().items():
-            out[k] = v
+    out = None
+    if sidecar and parsed_sources and key_policy is None:
+        from .sidecar import DEFAULT_TIMEOUT, get_from_sidecar
+        out = get_from_sidecar(
+            sidecar,
+            source,
+            options=options,
+            timeout=min(deadline or DEFAULT_TIMEOUT, DEFAULT_TIMEOUT),
+        )
+    if out is None:
+        fetched = fetch_all(
+            parsed_sources,
+            max_workers=max_workers,
+            cache=cache,
+            deadline=deadline,
+            hedge=hedge,
+            resilience=resilience or None,
+        )
+        results = [
+            (parsed_source.url.geturl(), data, parsed_source.error)
+            for parsed_source, data in zip(parsed_sources, fetched)
+        ]
+        out = merge(fetched)
+    else:
+        results = [(source, out, None)]
+    instrumentation.emit(instrumentation.Event(
+        instrumentation.GET_EVENT,
+        duration=time.time() - start,
+        sources=len(parsed_sources),
+        keys=len(out),
+    ))
+    return out, results
 
-    return out
+
+def aget(source=None, **kwargs):
+    """
+    Coroutine version of get() fetching every source without blocking the
+    event loop, see snagsby.aio.get. Python 3.5+ only.
+    """
+    from .aio import get as _aget
+    return _aget(source, **kwargs)
+
+
+def aload(source=None, dest=None, **kwargs):
+    """
+    Coroutine version of load(), see snagsby.aio.load. Python 3.5+ only.
+    """
+    from .aio import load as _aload
+    return _aload(source, dest, **kwargs)
+
+
+def watch(source=None, dest=None, interval=None, callbacks=None, **kwargs):
+    """
+    Loads the sources into dest and keeps them up to date in a background
+    thread, returning the started snagsby.watcher.Watcher. Call its stop()
+    method to stop refreshing.
+    """
+    from .watcher import DEFAULT_INTERVAL, Watcher
+    if interval is None:
+        interval = DEFAULT_INTERVAL
+    return Watcher(
+        source, dest, interval=interval, callbacks=callbacks, **kwargs
+    ).start()
+
+
+def lazy(source=None, manifest=None, **kwargs):
+    """
+    Returns a read only mapping of the sources that are only fetched on first
+    access, see snagsby.lazyconfig.LazyConfig. Its load() method loads them
+    into os.environ.
+    """
+    from .lazyconfig import LazyConfig
+    return LazyConfig(source, manifest=manifest, **kwargs)
 
 
-def load_object(obj, dest=None):
+def load_object(obj, dest=None, prune=False, key_policy=None):
     if dest is None:
         dest = os.environ
-    for k, v in sanitize(obj).items():
-        dest[k] = v
+    return update(dest, sanitize(obj, key_policy), prune=prune)
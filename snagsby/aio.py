@@ -0,0 +1,111 @@
+"""
+asyncio versions of snagsby.get and snagsby.load. Python 3.5+ only.
+
+Sources fetch concurrently without blocking the event loop. A source type can
+provide a native implementation by defining an ``aget_raw_data`` coroutine
+method, otherwise its synchronous ``get_data`` runs in a thread pool.
+"""
+from __future__ import absolute_import
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import instrumentation
+from .diff import update
+from .exceptions import DeadlineExceededError
+from .fetch import (DEFAULT_MAX_WORKERS, emit_source_events, merge, prefetch,
+                    read_cache, write_cache)
+from .sources import parse_sources, sanitize
+
+
+async def get_data(source, executor=None):
+    """
+    Coroutine version of SnagsbySource.get_data.
+    """
+    aget_raw_data = getattr(source, 'aget_raw_data', None)
+    if aget_raw_data is not None:
+        return sanitize(await aget_raw_data(), source.key_policy)
+
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, source.get_data)
+
+
+async def _gather(parsed_sources, executor, deadline=None):
+    if deadline is None or not parsed_sources:
+        return await asyncio.gather(*[
+            get_data(parsed_source, executor)
+            for parsed_source in parsed_sources
+        ])
+
+    for parsed_source in parsed_sources:
+        parsed_source.timeout = deadline
+    tasks = [
+        asyncio.ensure_future(get_data(parsed_source, executor))
+        for parsed_source in parsed_sources
+    ]
+    _, pending = await asyncio.wait(tasks, timeout=deadline)
+    if pending:
+        for task in pending:
+            task.cancel()
+        raise DeadlineExceededError([
+            parsed_source.url.geturl()
+            for parsed_source, task in zip(parsed_sources, tasks)
+            if task in pending
+        ])
+    return [task.result() for task in tasks]
+
+
+async def get(source=None, max_workers=None, options=None, cache=None,
+              deadline=None, key_policy=None):
+    """
+    ``deadline`` bounds the time spent fetching, in seconds, raising
+    DeadlineExceededError for the sources that didn't complete in time.
+    Unlike snagsby.get, failed fetches aren't retried.
+    """
+    start = time.time()
+    if source is None:
+        source = os.environ.get('SNAGSBY_SOURCE', '')
+
+    parsed_sources = parse_sources(
+        source, defaults=options, key_policy=key_policy)
+    if not parsed_sources:
+        return {}
+
+    loop = asyncio.get_event_loop()
+    executor = ThreadPoolExecutor(
+        max_workers=max_workers or DEFAULT_MAX_WORKERS)
+    try:
+        results, pending = await loop.run_in_executor(
+            executor, read_cache, parsed_sources, cache)
+
+        pending_sources = [parsed_sources[i] for i in pending]
+        await loop.run_in_executor(executor, prefetch, pending_sources)
+        fetched = await _gather(pending_sources, executor, deadline)
+        await loop.run_in_executor(
+            executor, write_cache, pending_sources, fetched, cache)
+    finally:
+        executor.shutdown(wait=False)
+
+    for i, data in zip(pending, fetched):
+        results[i] = data
+
+    emit_source_events(parsed_sources, results, pending, cache)
+    out = merge(results)
+    instrumentation.emit(instrumentation.Event(
+        instrumentation.GET_EVENT,
+        duration=time.time() - start,
+        sources=len(parsed_sources),
+        keys=len(out),
+    ))
+    return out
+
+
+async def load(source=None, dest=None, prune=False, **kwargs):
+    # Default to loading into the environment
+    if dest is None:
+        dest = os.environ
+
+    data = await get(source, **kwargs)
+    return update(dest, data, prune=prune)
@@ -0,0 +1,128 @@
+from __future__ import absolute_import
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+from .exceptions import CacheError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300
+
+CACHE_DIR_ENV = 'SNAGSBY_CACHE_DIR'
+CACHE_KEY_ENV = 'SNAGSBY_CACHE_KEY'
+
+# os.replace is python 3 only, os.rename is atomic on posix for python 2
+_replace = getattr(os, 'replace', os.rename)
+
+
+def default_cache_dir():
+    directory = os.environ.get(CACHE_DIR_ENV)
+    if directory:
+        return directory
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'snagsby')
+
+
+class CacheEntry(object):
+    def __init__(self, data, expires, meta=None):
+        self.data = data
+        self.expires = expires
+        self.meta = meta or {}
+
+    @property
+    def fresh(self):
+        return time.time() < self.expires
+
+
+class FileCache(object):
+    """
+    Stores the sanitized data of each source on disk, keyed by the source
+    url, so warm starts can skip the network until the entry expires.
+
+    Entries are written with mode 0600. When an encryption key is given (or
+    set in the SNAGSBY_CACHE_KEY environment variable) entries are encrypted
+    with Fernet, which requires the cryptography package.
+    """
+
+    def __init__(self, directory=None, ttl=DEFAULT_TTL, key=None):
+        self.directory = directory or default_cache_dir()
+        self.ttl = ttl
+        if key is None:
+            key = os.environ.get(CACHE_KEY_ENV) or None
+        self._fernet = self._get_fernet(key) if key else None
+
+    def _get_fernet(self, key):
+        try:
+            from cryptography.fernet import Fernet
+        except ImportError:
+            raise CacheError(
+                "The cryptography package is required to encrypt the cache")
+        try:
+            return Fernet(key)
+        except (TypeError, ValueError) as e:
+            raise CacheError("Invalid cache encryption key: {}".format(e))
+
+    def _path(self, url):
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + '.json')
+
+    def _encode(self, entry):
+        raw = json.dumps(entry).encode('utf-8')
+        if self._fernet is not None:
+            raw = self._fernet.encrypt(raw)
+        return raw
+
+    def _decode(self, raw):
+        if self._fernet is not None:
+            from cryptography.fernet import InvalidToken
+            try:
+                raw = self._fernet.decrypt(raw)
+            except InvalidToken:
+                raise ValueError("Unable to decrypt cache entry")
+        return json.loads(raw.decode('utf-8'))
+
+    def get(self, url):
+        """
+        Returns the CacheEntry stored for url, expired or not, or None when
+        there is no readable entry.
+        """
+        try:
+            with open(self._path(url), 'rb') as f:
+                entry = self._decode(f.read())
+        except (IOError, OSError):
+            return None
+        except ValueError as e:
+            logger.debug("Ignoring unreadable cache entry for %s: %s", url, e)
+            return None
+
+        if entry.get('url') != url:
+            return None
+        return CacheEntry(entry['data'], entry['expires'], entry.get('meta'))
+
+    def set(self, url, data, meta=None):
+        entry = {
+            'url': url,
+            'expires': time.time() + self.ttl,
+            'data': data,
+            'meta': meta or {},
+        }
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, 0o700)
+            # mkstemp creates the file with mode 0600
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(self._encode(entry))
+                _replace(tmp_path, self._path(url))
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+        except (IOError, OSError) as e:
+            logger.warning("Unable to write cache entry for %s: %s", url, e)
@@ -1,11 +1,17 @@
 from __future__ import absolute_import
 
 import argparse
+import os
 import sys
 
 from . import get as snagsby_get
+from . import instrumentation
+from .cache import DEFAULT_TTL, FileCache
 from .formatters import DEFAULT_FORMATTER, get_formatter
 from .formatters import registry as formatters_registry
+from .keys import CASE_LOWER, CASE_PRESERVE, CASE_UPPER, KeyPolicy
+from .snapshot import write_snapshot
+from .watcher import DEFAULT_INTERVAL
 from .version import __version__
 
 
@@ -19,23 +25,194 @@ class SnagsbyCli(object):
             return None
         return ",".join(source_arg)
 
-    def get_data(self, source):
-        return snagsby_get(source=self._build_source_from_arg(source))
+    def get_cache(self, args):
+        if not args.get('cache_dir'):
+            return None
+        return FileCache(
+            directory=args['cache_dir'],
+            ttl=(
+                DEFAULT_TTL if args.get('cache_ttl') is None
+                else args['cache_ttl']
+            ),
+        )
+
+    def get_key_policy(self, args):
+        if not args.get('key_case'):
+            return None
+        return KeyPolicy(case=args['key_case'])
+
+    def get_data(self, source, **kwargs):
+        return snagsby_get(
+            source=self._build_source_from_arg(source),
+            **kwargs
+        )
+
+    def write_timings(self, events, fp):
+        """
+        Writes a per source breakdown of the instrumentation events to fp.
+        """
+        def ms(seconds):
+            return '-' if seconds is None else '{:.1f}'.format(seconds * 1000)
+
+        template = '{:<50} {:>6} {:>10} {:>12} {:>10} {:>13} {:>6}\n'
+        fp.write(template.format(
+            'source', 'cache', 'bytes', 'network_ms', 'parse_ms',
+            'sanitize_ms', 'keys'))
+        for event in events:
+            if event.name == instrumentation.SOURCE_EVENT:
+                fp.write(template.format(
+                    event.url,
+                    event.cache or '-',
+                    '-' if event.bytes is None else event.bytes,
+                    ms(event.network_time),
+                    ms(event.parse_time),
+                    ms(event.sanitize_time),
+                    event.keys,
+                ))
+            elif event.name == instrumentation.GET_EVENT:
+                fp.write('total: {} sources, {} keys in {}ms\n'.format(
+                    event.sources, event.keys, ms(event.duration)))
 
     def main(self, args):
-        data = self.get_data(args['source'])
-        sys.stdout.write(get_formatter(args['output'], data).get_output())
+        events = []
+        if args.get('timings'):
+            instrumentation.subscribe(events.append)
+        try:
+            data = self.get_data(
+                args['source'],
+                max_workers=args.get('workers'),
+                cache=self.get_cache(args),
+                deadline=args.get('deadline'),
+                hedge=args.get('hedge', False),
+                key_policy=self.get_key_policy(args),
+            )
+        finally:
+            instrumentation.unsubscribe(events.append)
+        if events:
+            self.write_timings(events, sys.stderr)
+        if args.get('write_snapshot'):
+            write_snapshot(args['write_snapshot'], data)
+            return 0
+        get_formatter(args['output'], data).write_to(sys.stdout)
         sys.stdout.flush()
         return 0
 
+    def execute(self, args):
+        """
+        Replaces the process with the command, its environment updated with
+        the sources.
+        """
+        data = self.get_data(
+            args['source'],
+            max_workers=args.get('workers'),
+            cache=self.get_cache(args),
+            deadline=args.get('deadline'),
+            hedge=args.get('hedge', False),
+            key_policy=self.get_key_policy(args),
+        )
+        env = dict(os.environ)
+        env.update(data)
+        command = args['command']
+        os.execvpe(command[0], command, env)
+
+    def serve(self, args):
+        # Unix sockets aren't available everywhere, only the daemon needs them
+        from .sidecar import SidecarServer
+
+        server = SidecarServer(
+            path=args['socket'],
+            interval=args['interval'],
+            max_workers=args.get('workers'),
+            deadline=args.get('deadline'),
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+        return 0
+
+
+def serve_main(argv):
+    parser = argparse.ArgumentParser(
+        prog='snagsby serve',
+        description='Serve sources to the processes of this host over a '
+                    'unix socket')
+    parser.add_argument('-s', '--socket', default=None,
+                        help='Path of the unix socket, $SNAGSBY_SIDECAR or '
+                             'snagsby.sock in $XDG_RUNTIME_DIR by default')
+    parser.add_argument('-i', '--interval', type=float,
+                        default=DEFAULT_INTERVAL,
+                        help='Seconds between refreshes of each source')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Maximum number of sources fetched concurrently')
+    parser.add_argument('--deadline', type=float, default=None,
+                        help='Fail if sources take longer than this to fetch')
+    args = vars(parser.parse_args(argv))
+    if args['socket'] is None:
+        from .sidecar import default_socket_path
+        args['socket'] = default_socket_path()
+    if args['socket'] is None:
+        parser.error('--socket is required when neither SNAGSBY_SIDECAR nor '
+                     'XDG_RUNTIME_DIR is set')
+    cli = SnagsbyCli()
+    return cli.serve(args)
+
+
+def exec_main(argv):
+    parser = argparse.ArgumentParser(
+        prog='snagsby exec',
+        usage='%(prog)s [options] [source ...] -- command [arg ...]',
+        description='Run a command with the sources in its environment')
+    parser.add_argument('source', nargs='*')
+    add_fetch_arguments(parser)
+
+    if '--' not in argv:
+        parser.error('missing -- before the command')
+    split = argv.index('--')
+    args = vars(parser.parse_args(argv[:split]))
+    args['command'] = argv[split + 1:]
+    if not args['command']:
+        parser.error('missing command after --')
+    cli = SnagsbyCli()
+    return cli.execute(args)
+
+
+def add_fetch_arguments(parser):
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Maximum number of sources fetched concurrently')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Cache fetched sources in this directory')
+    parser.add_argument('--cache-ttl', type=int, default=DEFAULT_TTL,
+                        help='Seconds cached sources stay fresh')
+    parser.add_argument('--deadline', type=float, default=None,
+                        help='Fail if sources take longer than this to fetch')
+    parser.add_argument('--hedge', action='store_true',
+                        help='Send duplicate requests for slow sources')
+    parser.add_argument('--key-case', default=None,
+                        choices=[CASE_UPPER, CASE_LOWER, CASE_PRESERVE],
+                        help='Case keys are normalized to, upper by default')
+
 
 def main():
+    if sys.argv[1:2] == ['serve']:
+        sys.exit(serve_main(sys.argv[2:]))
+    if sys.argv[1:2] == ['exec']:
+        sys.exit(exec_main(sys.argv[2:]))
+
     parser = argparse.ArgumentParser(description='Snagsby')
     parser.add_argument('source', nargs='*')
     parser.add_argument('-v', '--version', action='version',
                         version='snagsby-py: {}'.format(__version__))
     parser.add_argument('-o', '--output', default=DEFAULT_FORMATTER,
                         choices=formatters_registry.get_names())
+    add_fetch_arguments(parser)
+    parser.add_argument('--timings', action='store_true',
+                        help='Print a per source timing breakdown to stderr')
+    parser.add_argument('--write-snapshot', default=None, metavar='PATH',
+                        help='Write the sources to a snapshot file instead '
+                             'of printing them')
     cli = SnagsbyCli()
     sys.exit(cli.main(vars(parser.parse_args())))
 
@@ -0,0 +1,186 @@
+from __future__ import absolute_import
+
+import bz2
+import zlib
+
+from .exceptions import CompressionError
+
+GZIP = 'gzip'
+BZ2 = 'bz2'
+ZSTD = 'zstd'
+
+# Bytes read from the underlying body at a time
+CHUNK_SIZE = 64 * 1024
+
+CONTENT_ENCODINGS = {
+    'gzip': GZIP,
+    'x-gzip': GZIP,
+    'bzip2': BZ2,
+    'x-bzip2': BZ2,
+    'zstd': ZSTD,
+}
+
+CONTENT_TYPES = {
+    'application/gzip': GZIP,
+    'application/x-gzip': GZIP,
+    'application/x-bzip2': BZ2,
+    'application/zstd': ZSTD,
+}
+
+EXTENSIONS = {
+    '.gz': GZIP,
+    '.bz2': BZ2,
+    '.zst': ZSTD,
+}
+
+MAGIC_BYTES = {
+    b'\x1f\x8b': GZIP,
+    b'BZh': BZ2,
+    b'\x28\xb5\x2f\xfd': ZSTD,
+}
+
+
+def detect(content_encoding=None, content_type=None, key=None, head=b''):
+    """
+    Returns the compression of an object from its ContentEncoding, its
+    ContentType, the extension of its key or the magic bytes its body
+    starts with, None when it isn't compressed.
+    """
+    if content_encoding:
+        compression = CONTENT_ENCODINGS.get(content_encoding.lower())
+        if compression:
+            return compression
+    if content_type:
+        compression = CONTENT_TYPES.get(
+            content_type.split(';')[0].strip().lower())
+        if compression:
+            return compression
+    if key:
+        for extension, compression in EXTENSIONS.items():
+            if key.endswith(extension):
+                return compression
+    for magic, compression in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def get_decompressor(compression):
+    """
+    Returns a decompressor object, whose decompress method decompresses
+    successive chunks of a single gzip member or bz2/zstd stream.
+    """
+    if compression == GZIP:
+        # 16 + MAX_WBITS expects a gzip header and trailer
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if compression == BZ2:
+        return bz2.BZ2Decompressor()
+    if compression == ZSTD:
+        try:
+            import zstandard
+        except ImportError:
+            raise CompressionError(
+                "The zstandard package is required to read zstd objects")
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise CompressionError("Unsupported compression: {}".format(compression))
+
+
+def _at_eof(decompressor):
+    eof = getattr(decompressor, 'eof', None)
+    if eof is None:
+        # Python 2 decompressors only keep the data past the end of stream
+        return bool(getattr(decompressor, 'unused_data', b''))
+    return eof
+
+
+class _PrefixedReader(object):
+    """
+    Reads bytes already read from ``raw`` before the rest of it.
+    """
+
+    def __init__(self, head, raw):
+        self.head = head
+        self.raw = raw
+
+    def read(self, size=-1):
+        if not self.head:
+            return self.raw.read() if size < 0 else self.raw.read(size)
+        if size < 0:
+            head, self.head = self.head, b''
+            return head + self.raw.read()
+        head, self.head = self.head[:size], self.head[size:]
+        if len(head) < size:
+            head += self.raw.read(size - len(head))
+        return head
+
+
+class DecompressingReader(object):
+    """
+    File like object decompressing ``raw`` chunk by chunk as it's read, so
+    the compressed body is never buffered whole. Concatenated gzip members or
+    bz2 streams are read one after the other, like the gzip and bz2 modules.
+    """
+
+    def __init__(self, raw, compression, chunk_size=CHUNK_SIZE):
+        self.raw = raw
+        self.compression = compression
+        self.chunk_size = chunk_size
+        self._decompressor = get_decompressor(compression)
+        self._buffer = b''
+        self._eof = False
+
+    def _read_chunk(self):
+        chunk = self.raw.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            return b''
+        try:
+            return self._decompress(chunk)
+        except (EOFError, IOError, OSError, ValueError, zlib.error) as e:
+            raise CompressionError("Unable to decompress {} data: {}".format(
+                self.compression, e))
+
+    def _decompress(self, data):
+        out = []
+        while data:
+            if _at_eof(self._decompressor):
+                if self.compression == GZIP:
+                    # gzip allows zero padding after a member
+                    data = data.lstrip(b'\x00')
+                    if not data:
+                        break
+                self._decompressor = get_decompressor(self.compression)
+            decompressor = self._decompressor
+            out.append(decompressor.decompress(data))
+            # Data past the end of the member starts the next one
+            data = b''
+            if _at_eof(decompressor):
+                data = getattr(decompressor, 'unused_data', b'')
+        return b''.join(out)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = [self._buffer]
+            while not self._eof:
+                chunks.append(self._read_chunk())
+            self._buffer = b''
+            return b''.join(chunks)
+
+        while not self._eof and len(self._buffer) < size:
+            self._buffer += self._read_chunk()
+        out, self._buffer = self._buffer[:size], self._buffer[size:]
+        return out
+
+
+def open_body(body, content_encoding=None, content_type=None, key=None):
+    """
+    Returns a file like object reading the decompressed content of an S3
+    object body, along with the compression detected (None if the body isn't
+    compressed).
+    """
+    head = body.read(len(max(MAGIC_BYTES, key=len)))
+    compression = detect(content_encoding, content_type, key, head)
+    reader = _PrefixedReader(head, body)
+    if compression is None:
+        return reader, None
+    return DecompressingReader(reader, compression), compression
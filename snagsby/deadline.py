@@ -0,0 +1,200 @@
+from __future__ import absolute_import
+
+import copy
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+from .exceptions import DeadlineExceededError
+from .fetch import fetch_source
+
+logger = logging.getLogger(__name__)
+
+# Attempts made for each source before giving up, unless the source sets the
+# retries option
+DEFAULT_RETRIES = 2
+
+# Full jitter exponential backoff between attempts
+BACKOFF_BASE = 0.1
+BACKOFF_CAP = 2.0
+
+# Sources still in flight past this latency percentile get a hedged request
+HEDGE_PERCENTILE = 95
+# Delay used before enough latencies have been recorded for a percentile
+DEFAULT_HEDGE_DELAY = 1.0
+MIN_SAMPLES = 10
+MAX_SAMPLES = 100
+
+
+class Deadline(object):
+    def __init__(self, timeout):
+        self.expires = time.time() + timeout
+
+    def remaining(self):
+        return max(0, self.expires - time.time())
+
+    @property
+    def expired(self):
+        return not self.remaining()
+
+
+class LatencyTracker(object):
+    """
+    Keeps the most recent fetch latencies of each source type.
+    """
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.max_samples = max_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, latency):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.max_samples)
+            samples.append(latency)
+
+    def percentile(self, name, percentile, default=None):
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if len(samples) < MIN_SAMPLES:
+            return default
+        index = int(round(percentile / 100.0 * (len(samples) - 1)))
+        return samples[index]
+
+
+latencies = LatencyTracker()
+
+
+def backoff(attempt):
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def fetch_with_retries(parsed_source, deadline, coalesce=True):
+    """
+    Fetches a source, retrying failures with jittered backoff while there is
+    time left. Each attempt gets an equal share of the remaining budget as
+    its request timeout. Unless ``coalesce`` is False, attempts share an
+    identical fetch in flight in another thread, see fetch.fetch_source.
+    """
+    attempts = 1 + int(parsed_source.options.get('retries', DEFAULT_RETRIES))
+    for attempt in range(attempts):
+        parsed_source.timeout = deadline.remaining() / (attempts - attempt)
+        start = time.time()
+        try:
+            if coalesce:
+                data = fetch_source(parsed_source)
+            else:
+                data = parsed_source.get_data()
+        except Exception as e:
+            if attempt + 1 == attempts or deadline.expired:
+                raise
+            logger.debug("Retrying %s after: %s", parsed_source.url.geturl(), e)
+            time.sleep(min(backoff(attempt), deadline.remaining()))
+            continue
+        latencies.record(parsed_source.url.scheme, time.time() - start)
+        return data
+
+
+def _hedge_delay(parsed_source):
+    return latencies.percentile(
+        parsed_source.url.scheme, HEDGE_PERCENTILE, DEFAULT_HEDGE_DELAY)
+
+
+def fetch_with_deadline(parsed_sources, deadline, max_workers, hedge=False):
+    """
+    Fetches every source within the deadline, returning the results in the
+    same order as ``parsed_sources``. With ``hedge``, a duplicate request is
+    fired for each source still in flight past its latency percentile and
+    the first response wins. Raises DeadlineExceededError listing the sources
+    that didn't complete in time. The error and stats of a winning hedge are
+    set on the source it raced for.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    if not parsed_sources:
+        return []
+
+    start = time.time()
+    executor = ThreadPoolExecutor(
+        max_workers=max_workers * 2 if hedge else max_workers)
+    attempts = {}
+    # The source each attempt fetches, hedges run on a copy
+    attempt_sources = {}
+    for i, parsed_source in enumerate(parsed_sources):
+        future = executor.submit(fetch_with_retries, parsed_source, deadline)
+        attempts[i] = [future]
+        attempt_sources[future] = parsed_source
+
+    results = {}
+    hedged = set()
+
+    def collect():
+        for i, attempted in attempts.items():
+            if i in results:
+                continue
+            for future in attempted:
+                if future.done() and future.exception() is None:
+                    results[i] = future.result()
+                    winner = attempt_sources[future]
+                    if winner is not parsed_sources[i]:
+                        parsed_sources[i].error = winner.error
+                        parsed_sources[i].stats = winner.stats
+                    break
+            else:
+                if all(future.done() for future in attempted):
+                    # Every attempt failed, there is nothing left to wait on
+                    raise attempted[0].exception()
+
+    try:
+        while True:
+            collect()
+            if len(results) == len(parsed_sources) or deadline.expired:
+                break
+
+            timeout = deadline.remaining()
+            if hedge:
+                for i, parsed_source in enumerate(parsed_sources):
+                    if i in results or i in hedged:
+                        continue
+                    hedge_at = start + _hedge_delay(parsed_source)
+                    if hedge_at <= time.time():
+                        logger.debug(
+                            "Hedging %s", parsed_source.url.geturl())
+                        hedged_source = copy.copy(parsed_source)
+                        hedged_source.stats = {}
+                        hedged_source.error = None
+                        # Hedges must not join the request they race against
+                        future = executor.submit(
+                            fetch_with_retries, hedged_source, deadline,
+                            coalesce=False)
+                        attempts[i].append(future)
+                        attempt_sources[future] = hedged_source
+                        hedged.add(i)
+                    else:
+                        timeout = min(timeout, hedge_at - time.time())
+
+            # Futures that completed since collect() are kept so the wait
+            # returns straight away, failed attempts are left out.
+            outstanding = [
+                future for i, attempted in attempts.items()
+                if i not in results
+                for future in attempted
+                if not future.done() or future.exception() is None
+            ]
+            wait(outstanding, timeout=timeout, return_when=FIRST_COMPLETED)
+    finally:
+        executor.shutdown(wait=False)
+
+    missed = [
+        parsed_source.url.geturl()
+        for i, parsed_source in enumerate(parsed_sources)
+        if i not in results
+    ]
+    if missed:
+        raise DeadlineExceededError(missed)
+
+    return [results[i] for i in range(len(parsed_sources))]
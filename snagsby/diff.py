@@ -0,0 +1,107 @@
+from __future__ import absolute_import
+
+import threading
+
+# Keys written by the previous pruning update of each destination. The
+# destination is kept alongside its keys so its id can't be reused.
+_owned_keys = {}
+_owned_keys_lock = threading.Lock()
+
+
+class Diff(object):
+    """
+    Differences between two loads of the same sources.
+
+    ``added`` and ``removed`` map keys to their new and old values, ``changed``
+    maps keys to (old, new) tuples and ``unchanged`` is the set of keys whose
+    value is the same.
+    """
+
+    def __init__(self, added=None, changed=None, removed=None, unchanged=None):
+        self.added = added or {}
+        self.changed = changed or {}
+        self.removed = removed or {}
+        self.unchanged = unchanged or set()
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        return isinstance(other, Diff) and (
+            self.added == other.added
+            and self.changed == other.changed
+            and self.removed == other.removed
+            and self.unchanged == other.unchanged
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<Diff added={} changed={} removed={} unchanged={}>'.format(
+            sorted(self.added),
+            sorted(self.changed),
+            sorted(self.removed),
+            len(self.unchanged),
+        )
+
+    def apply(self, dest):
+        """
+        Writes the added and changed keys into dest and removes the removed
+        keys, leaving unchanged keys alone.
+        """
+        for k, v in self.added.items():
+            dest[k] = v
+        for k, (_, v) in self.changed.items():
+            dest[k] = v
+        for k in self.removed:
+            dest.pop(k, None)
+
+
+def diff(old, new):
+    """
+    Computes the Diff turning the ``old`` mapping into the ``new`` one.
+    """
+    result = Diff()
+    for k, v in new.items():
+        if k not in old:
+            result.added[k] = v
+        elif old[k] != v:
+            result.changed[k] = (old[k], v)
+        else:
+            result.unchanged.add(k)
+    for k, v in old.items():
+        if k not in new:
+            result.removed[k] = v
+    return result
+
+
+def update(dest, data, prune=False):
+    """
+    Writes data into dest, only setting keys whose value differs from the
+    one already in dest, and returns the Diff. With ``prune``, keys written
+    by the previous pruning update of dest that are no longer in data are
+    removed from dest.
+    """
+    with _owned_keys_lock:
+        previous_keys = ()
+        if prune:
+            previous_keys = _owned_keys.get(id(dest), (dest, ()))[1]
+            _owned_keys[id(dest)] = (dest, frozenset(data))
+
+    changes = Diff()
+    for k, v in data.items():
+        if k not in dest:
+            changes.added[k] = v
+        elif dest[k] != v:
+            changes.changed[k] = (dest[k], v)
+        else:
+            changes.unchanged.add(k)
+    for k in previous_keys:
+        if k not in data and k in dest:
+            changes.removed[k] = dest[k]
+
+    changes.apply(dest)
+    return changes
@@ -1,2 +1,52 @@
 class InvalidFormatterError(Exception):
     pass
+
+
+class CacheError(Exception):
+    pass
+
+
+class DeadlineExceededError(Exception):
+    def __init__(self, sources):
+        self.sources = sources
+        super(DeadlineExceededError, self).__init__(
+            "Deadline exceeded fetching: {}".format(", ".join(sources)))
+
+
+class SourceError(Exception):
+    """
+    Raised by get(..., raise_errors=True) when sources reported an error
+    rather than returning their data. ``errors`` maps their urls to the
+    errors.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.sources = list(errors)
+        super(SourceError, self).__init__(
+            "Errors fetching: {}".format(", ".join(self.sources)))
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, sources):
+        self.sources = sources
+        super(CircuitOpenError, self).__init__(
+            "Circuit open for: {}".format(", ".join(sources)))
+
+
+class SidecarError(Exception):
+    pass
+
+
+class UntrustedSidecarError(SidecarError):
+    """
+    The sidecar socket is owned by another user, who could serve anything.
+    """
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class CompressionError(Exception):
+    pass
@@ -0,0 +1,217 @@
+from __future__ import absolute_import
+
+from collections import OrderedDict
+
+from . import instrumentation
+from .singleflight import flights
+
+# Upper bound on the number of sources fetched at the same time
+DEFAULT_MAX_WORKERS = 10
+
+
+def prefetch(parsed_sources):
+    """
+    Gives each source type a chance to fetch its sources in bulk. Sources
+    already being fetched by another thread are left out, fetch_source()
+    waits on that fetch instead.
+    """
+    by_type = OrderedDict()
+    for parsed_source in parsed_sources:
+        if flights.in_flight(parsed_source.cache_key):
+            continue
+        by_type.setdefault(type(parsed_source), []).append(parsed_source)
+    for source_type, group in by_type.items():
+        source_type.prefetch(group)
+
+
+def fetch_source(parsed_source):
+    """
+    Fetches the data of a source, sharing the result of an identical fetch
+    already in flight in another thread. The error reported by the source
+    that fetched is set on every source sharing its result.
+    """
+    def get_data():
+        return parsed_source.get_data(), parsed_source.error
+
+    def fetch():
+        data, error = flights.do(parsed_source.cache_key, get_data)
+        parsed_source.error = error
+        return data
+
+    if parsed_source.resilience is not None:
+        return parsed_source.resilience.call(parsed_source, fetch)
+    return fetch()
+
+
+def dedupe(parsed_sources):
+    """
+    Returns the distinct sources, by cache key, in order of first appearance.
+    """
+    unique = OrderedDict()
+    for parsed_source in parsed_sources:
+        unique.setdefault(parsed_source.cache_key, parsed_source)
+    return list(unique.values())
+
+
+def concurrent_map(fn, items, max_workers=None):
+    """
+    Calls fn for every item, concurrently when there is more than one item
+    and more than one worker. Results are returned in the same order as
+    ``items``.
+    """
+    if max_workers is None:
+        max_workers = DEFAULT_MAX_WORKERS
+    max_workers = min(max_workers, len(items))
+
+    if max_workers <= 1:
+        return [fn(item) for item in items]
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(fn, items))
+
+
+def read_cache(parsed_sources, cache):
+    """
+    Returns the results served from fresh cache entries, None for the other
+    sources, along with the indexes of the sources left to fetch.
+    """
+    results = [None] * len(parsed_sources)
+    pending = []
+
+    for i, parsed_source in enumerate(parsed_sources):
+        entry = cache.get(parsed_source.cache_key) if cache else None
+        if entry is not None:
+            if entry.fresh:
+                results[i] = entry.data
+                continue
+            # Lets the source revalidate the expired data rather than refetch
+            parsed_source.restore_cache_meta(entry.meta, entry.data)
+        pending.append(i)
+
+    return results, pending
+
+
+def read_stale(parsed_sources, results, pending, resilience):
+    """
+    Fills results with the data resilience serves in place of fetching,
+    returning the indexes of the sources left to fetch.
+    """
+    left = []
+    for i in pending:
+        data = resilience.get_stale(parsed_sources[i])
+        if data is None:
+            parsed_sources[i].resilience = resilience
+            left.append(i)
+        else:
+            results[i] = data
+    return left
+
+
+def write_cache(parsed_sources, fetched, cache):
+    """
+    Caches the fetched data, except for sources that reported an error (like
+    SMSource returning no data when throttled) so it isn't served later on.
+    """
+    if not cache:
+        return
+    for parsed_source, data in zip(parsed_sources, fetched):
+        if parsed_source.error is not None:
+            continue
+        cache.set(
+            parsed_source.cache_key,
+            data,
+            meta=parsed_source.get_cache_meta(),
+        )
+
+
+def emit_source_events(parsed_sources, results, pending, cache):
+    if not instrumentation.instrumentation.enabled:
+        return
+    pending = set(pending)
+    for i, (parsed_source, data) in enumerate(zip(parsed_sources, results)):
+        status = None
+        if cache:
+            status = 'miss' if i in pending else 'hit'
+        instrumentation.emit(
+            instrumentation.source_event(parsed_source, data, status))
+
+
+def fetch_all(parsed_sources, max_workers=None, cache=None, deadline=None,
+              hedge=False, resilience=None):
+    """
+    Fetches the data for every source, returning the results in the same
+    order as ``parsed_sources``. Fresh cache entries are served without
+    fetching, and the remaining sources are prefetched in bulk where their
+    type supports it before being fetched concurrently.
+
+    With a ``deadline`` in seconds, failed fetches are retried and the whole
+    fetch is bounded, see snagsby.deadline.fetch_with_deadline.
+
+    Sources repeated with the same url and options are fetched once, and
+    share the result of identical fetches in flight in other threads.
+
+    With a snagsby.resilience.Resilience, the last good result of sources
+    is served stale rather than fetched where it allows.
+    """
+    unique_sources = dedupe(parsed_sources)
+    if len(unique_sources) < len(parsed_sources):
+        fetched = fetch_all(
+            unique_sources,
+            max_workers=max_workers,
+            cache=cache,
+            deadline=deadline,
+            hedge=hedge,
+            resilience=resilience,
+        )
+        by_key = {
+            parsed_source.cache_key: data
+            for parsed_source, data in zip(unique_sources, fetched)
+        }
+        return [
+            by_key[parsed_source.cache_key] for parsed_source in parsed_sources
+        ]
+
+    results, pending = read_cache(parsed_sources, cache)
+    if resilience is not None:
+        pending = read_stale(parsed_sources, results, pending, resilience)
+
+    pending_sources = [parsed_sources[i] for i in pending]
+    if deadline is None:
+        prefetch(pending_sources)
+        fetched = concurrent_map(
+            fetch_source,
+            pending_sources,
+            max_workers=max_workers,
+        )
+    else:
+        from .deadline import Deadline, fetch_with_deadline
+        deadline = Deadline(deadline)
+        for parsed_source in pending_sources:
+            parsed_source.timeout = deadline.remaining()
+        prefetch(pending_sources)
+        fetched = fetch_with_deadline(
+            pending_sources,
+            deadline,
+            max_workers=max_workers or DEFAULT_MAX_WORKERS,
+            hedge=hedge,
+        )
+    write_cache(pending_sources, fetched, cache)
+
+    for i, data in zip(pending, fetched):
+        results[i] = data
+
+    emit_source_events(parsed_sources, results, pending, cache)
+    return results
+
+
+def merge(fetched):
+    """
+    Merges fetched data left to right so later sources override earlier ones.
+    """
+    out = {}
+    for data in fetched:
+        for k, v in data.items():
+            out[k] = v
+    return out
@@ -6,17 +6,60 @@ from .exceptions import InvalidFormatterError
 from .registry import Registry
 
 
+class _Buffer(object):
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, chunk):
+        self.chunks.append(chunk)
+
+    def getvalue(self):
+        return ''.join(self.chunks)
+
+
 class SnagsbyFormatter(object):
+    # Number of keys rendered per write when streaming
+    chunk_size = 1000
+
     def __init__(self, data):
         self.data = data
 
     def get_output(self):
         raise NotImplementedError("Please implement the get_output method")
 
+    def write_to(self, fp):
+        """
+        Writes the output to the file object fp. Formatters able to stream
+        their output in chunks override this.
+        """
+        fp.write(self.get_output())
+
+    def _get_output_from_write_to(self):
+        buf = _Buffer()
+        self.write_to(buf)
+        return buf.getvalue()
+
+    def _iter_key_chunks(self):
+        keys = sorted(self.data)
+        for i in range(0, len(keys), self.chunk_size):
+            yield i, keys[i:i + self.chunk_size]
+
 
 class JsonFormatter(SnagsbyFormatter):
     def get_output(self):
-        return json.dumps(self.data, sort_keys=True)
+        return self._get_output_from_write_to()
+
+    def write_to(self, fp):
+        # Renders the same output as json.dumps(data, sort_keys=True) for the
+        # string keys produced by sanitize(), without building it all at once
+        fp.write('{')
+        for i, keys in self._iter_key_chunks():
+            items = [
+                '{}: {}'.format(json.dumps(key), json.dumps(self.data[key]))
+                for key in keys
+            ]
+            fp.write((', ' if i else '') + ', '.join(items))
+        fp.write('}')
 
 
 class EnvFormatter(SnagsbyFormatter):
@@ -29,12 +72,12 @@ class EnvFormatter(SnagsbyFormatter):
         return template.format(key=key, value=value)
 
     def get_output(self):
-        lines = [
-            self._format_line(key, value)
-            for key, value in self.data.items()
-        ]
+        return self._get_output_from_write_to()
 
-        return "\n".join(sorted(lines))
+    def write_to(self, fp):
+        for i, keys in self._iter_key_chunks():
+            lines = [self._format_line(key, self.data[key]) for key in keys]
+            fp.write(("\n" if i else "") + "\n".join(lines))
 
 
 registry = Registry()
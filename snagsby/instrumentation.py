@@ -0,0 +1,206 @@
+from __future__ import absolute_import
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Emitted once per source fetched by get(), or served from its cache
+SOURCE_EVENT = 'source'
+# Emitted once per get() call
+GET_EVENT = 'get'
+# Emitted when snagsby.resilience serves the last good result of a source
+STALE_EVENT = 'stale'
+
+SOURCE_FIELDS = (
+    'url', 'scheme', 'region', 'bytes', 'network_time', 'parse_time',
+    'sanitize_time', 'keys', 'cache',
+)
+
+
+class Event(object):
+    """
+    An instrumentation event. Source events carry the SOURCE_FIELDS, with
+    times in seconds and cache set to 'hit', 'miss' or None when no cache is
+    used. Get events carry the total ``duration``, number of ``sources`` and
+    ``keys``. Stale events carry the ``url``, ``scheme``, ``age`` in seconds
+    and ``reason`` (revalidating, circuit_open or error).
+    """
+
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = fields
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['fields'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __repr__(self):
+        return '<Event {} {!r}>'.format(self.name, self.fields)
+
+
+def source_event(parsed_source, data, cache=None):
+    stats = parsed_source.stats
+    return Event(
+        SOURCE_EVENT,
+        url=parsed_source.url.geturl(),
+        scheme=parsed_source.url.scheme,
+        region=getattr(parsed_source, 'region_name', None),
+        bytes=stats.get('bytes'),
+        network_time=stats.get('network_time'),
+        parse_time=stats.get('parse_time'),
+        sanitize_time=stats.get('sanitize_time'),
+        keys=len(data),
+        cache=cache,
+    )
+
+
+class Instrumentation(object):
+    """
+    Registry of observers, callables receiving every Event.
+    """
+
+    def __init__(self):
+        self._observers = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self._observers)
+
+    def subscribe(self, observer):
+        with self._lock:
+            self._observers = self._observers + [observer]
+        return observer
+
+    def unsubscribe(self, observer):
+        with self._lock:
+            self._observers = [o for o in self._observers if o != observer]
+
+    def emit(self, event):
+        for observer in self._observers:
+            try:
+                observer(event)
+            except Exception:
+                logger.exception("Snagsby instrumentation observer failed")
+
+
+instrumentation = Instrumentation()
+subscribe = instrumentation.subscribe
+unsubscribe = instrumentation.unsubscribe
+emit = instrumentation.emit
+
+
+def _ms(seconds):
+    return '-' if seconds is None else '{:.1f}ms'.format(seconds * 1000)
+
+
+class LoggingObserver(object):
+    def __init__(self, logger=logger, level=logging.INFO):
+        self.logger = logger
+        self.level = level
+
+    def __call__(self, event):
+        if event.name == SOURCE_EVENT:
+            self.logger.log(
+                self.level,
+                "Snagsby fetched %s cache=%s bytes=%s network=%s parse=%s "
+                "sanitize=%s keys=%s",
+                event.url,
+                event.cache,
+                event.bytes,
+                _ms(event.network_time),
+                _ms(event.parse_time),
+                _ms(event.sanitize_time),
+                event.keys,
+            )
+        elif event.name == GET_EVENT:
+            self.logger.log(
+                self.level,
+                "Snagsby loaded %s sources with %s keys in %s",
+                event.sources,
+                event.keys,
+                _ms(event.duration),
+            )
+        elif event.name == STALE_EVENT:
+            self.logger.log(
+                max(self.level, logging.WARNING),
+                "Snagsby served stale %s (%s) from %.1fs ago",
+                event.url,
+                event.reason,
+                event.age,
+            )
+
+
+class MetricsObserver(object):
+    """
+    Translates events into metrics for Prometheus style backends. ``record``
+    is called with a metric name, a value and a dict of labels:
+
+        snagsby_source_network_seconds, snagsby_source_parse_seconds,
+        snagsby_source_sanitize_seconds, snagsby_source_bytes,
+        snagsby_source_keys (labels: scheme, region, cache)
+        snagsby_source_stale_seconds (labels: scheme, reason)
+        snagsby_get_seconds, snagsby_get_keys
+    """
+
+    prefix = 'snagsby'
+
+    def __init__(self, record, prefix=None):
+        self.record = record
+        if prefix is not None:
+            self.prefix = prefix
+
+    def _record(self, name, value, labels):
+        if value is not None:
+            self.record('{}_{}'.format(self.prefix, name), value, labels)
+
+    def __call__(self, event):
+        if event.name == SOURCE_EVENT:
+            labels = {
+                'scheme': event.scheme,
+                'region': event.region or '',
+                'cache': event.cache or '',
+            }
+            self._record('source_network_seconds', event.network_time, labels)
+            self._record('source_parse_seconds', event.parse_time, labels)
+            self._record('source_sanitize_seconds', event.sanitize_time, labels)
+            self._record('source_bytes', event.bytes, labels)
+            self._record('source_keys', event.keys, labels)
+        elif event.name == GET_EVENT:
+            self._record('get_seconds', event.duration, {})
+            self._record('get_keys', event.keys, {})
+        elif event.name == STALE_EVENT:
+            self._record('source_stale_seconds', event.age, {
+                'scheme': event.scheme,
+                'reason': event.reason,
+            })
+
+
+class StatsdObserver(MetricsObserver):
+    """
+    Sends events to a statsd client (timing, gauge and incr methods, like the
+    statsd package's StatsClient), using dotted metric names including the
+    labels, e.g. snagsby.source.s3.network.
+    """
+
+    def __init__(self, client, prefix=None):
+        self.client = client
+        super(StatsdObserver, self).__init__(self._send, prefix)
+
+    def _send(self, name, value, labels):
+        name = name.replace('_', '.')
+        if labels.get('scheme'):
+            name = name.replace('.source.', '.source.{}.'.format(
+                labels['scheme']), 1)
+        if name.endswith('.seconds'):
+            self.client.timing(name[:-len('.seconds')], value * 1000)
+        else:
+            self.client.gauge(name, value)
+
+    def __call__(self, event):
+        super(StatsdObserver, self).__call__(event)
+        if event.name == SOURCE_EVENT and event.cache:
+            self.client.incr('{}.cache.{}'.format(self.prefix, event.cache))
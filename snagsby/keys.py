@@ -0,0 +1,180 @@
+from __future__ import absolute_import
+
+import re
+
+KEY_REGEX = re.compile(r'^\w+$')
+
+# Number of keys memoized by a KeyPolicy, see KeyMemo
+DEFAULT_MEMO_SIZE = 2 ** 17
+
+CASE_UPPER = 'upper'
+CASE_LOWER = 'lower'
+CASE_PRESERVE = 'preserve'
+
+_MISSING = object()
+
+
+class KeyMemo(object):
+    """
+    Bounded memo approximating an LRU with two generations of plain dicts,
+    so lookups need no lock: recently used keys live in the young generation
+    and are promoted back to it from the old one. When the young generation
+    holds ``maxsize`` keys it becomes the old one, dropping the least
+    recently used keys, so at most 2 * maxsize keys are held.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MEMO_SIZE):
+        self.maxsize = maxsize
+        self._young = {}
+        self._old = {}
+
+    def __len__(self):
+        return len(self._young) + len(self._old)
+
+    def get(self, key, default=None):
+        value = self._young.get(key, _MISSING)
+        if value is _MISSING:
+            value = self._old.get(key, _MISSING)
+            if value is _MISSING:
+                return default
+            self.set(key, value)
+        return value
+
+    def set(self, key, value):
+        young = self._young
+        young[key] = value
+        if len(young) >= self.maxsize:
+            self._old = young
+            self._young = {}
+
+    def update(self, values):
+        """
+        Sets many keys from the ``values`` dict, which the memo may keep
+        rather than copy. A single update larger than maxsize becomes the old
+        generation as a whole.
+        """
+        young = self._young
+        if young:
+            young.update(values)
+        else:
+            young = self._young = values
+        if len(young) >= self.maxsize:
+            self._old = young
+            self._young = {}
+
+    def clear(self):
+        self._young = {}
+        self._old = {}
+
+
+class KeyPolicy(object):
+    """
+    Decides which keys are kept by sanitize() and how they are normalized.
+    Keys are normalized to ``case`` ('upper', 'lower' or 'preserve'), then
+    rejected if they don't match ``regex`` or are one of the ``reserved``
+    names (compared case insensitively). Decisions are memoized per key.
+    """
+
+    def __init__(self, regex=KEY_REGEX, case=CASE_UPPER,
+                 reserved=('SNAGSBY_SOURCE',), memo_size=DEFAULT_MEMO_SIZE):
+        if case not in (CASE_UPPER, CASE_LOWER, CASE_PRESERVE):
+            raise ValueError("Invalid key case: {}".format(case))
+        if not hasattr(regex, 'match'):
+            regex = re.compile(regex)
+        self.regex = regex
+        self.case = case
+        self.reserved = frozenset(name.upper() for name in reserved)
+        self.memo = KeyMemo(memo_size)
+        # Identifies the policy in the cache keys of the sources using it,
+        # since caches store sanitized data
+        self.cache_key = "{}:{}:{}:{}".format(
+            self.case,
+            self.regex.flags,
+            self.regex.pattern,
+            ",".join(sorted(self.reserved)),
+        )
+
+    def _normalize(self, key):
+        if self.case == CASE_UPPER:
+            normalized = key.upper()
+            upper = normalized
+        else:
+            normalized = key.lower() if self.case == CASE_LOWER else key
+            upper = key.upper()
+
+        if not self.regex.match(normalized) or upper in self.reserved:
+            return None
+        return normalized
+
+    def normalize(self, key):
+        """
+        Returns the normalized key, or None when the key is rejected.
+        """
+        # Looking up the young generation first keeps the common hit cheap
+        normalized = self.memo._young.get(key, _MISSING)
+        if normalized is _MISSING:
+            normalized = self.memo.get(key, _MISSING)
+            if normalized is _MISSING:
+                normalized = self._normalize(key)
+                self.memo.set(key, normalized)
+        return normalized
+
+    def normalize_items(self, items):
+        """
+        Yields the (normalized key, value) pairs of the keys kept by the
+        policy. Cheaper than calling normalize() for each key: keys missing
+        from the memo are normalized inline and memoized in a single update
+        once the items are exhausted.
+        """
+        young = self.memo._young
+        old = self.memo._old
+        match = self.regex.match
+        reserved = self.reserved
+        case = self.case
+        misses = {}
+
+        if not young and not old:
+            # Nothing memoized yet, such as the first load of the process
+            upper_case = case == CASE_UPPER
+            lower_case = case == CASE_LOWER
+            try:
+                for key, value in items:
+                    upper = key.upper()
+                    if upper_case:
+                        normalized = upper
+                    elif lower_case:
+                        normalized = key.lower()
+                    else:
+                        normalized = key
+                    if match(normalized) and upper not in reserved:
+                        misses[key] = normalized
+                        yield normalized, value
+                    else:
+                        misses[key] = None
+            finally:
+                self.memo.update(misses)
+            return
+
+        try:
+            for key, value in items:
+                normalized = young.get(key, _MISSING)
+                if normalized is _MISSING:
+                    normalized = old.get(key, _MISSING)
+                    if normalized is _MISSING:
+                        upper = key.upper()
+                        if case == CASE_UPPER:
+                            normalized = upper
+                        elif case == CASE_LOWER:
+                            normalized = key.lower()
+                        else:
+                            normalized = key
+                        if not match(normalized) or upper in reserved:
+                            normalized = None
+                    misses[key] = normalized
+                if normalized is not None:
+                    yield normalized, value
+        finally:
+            if misses:
+                self.memo.update(misses)
+
+DEFAULT_KEY_POLICY = KeyPolicy()
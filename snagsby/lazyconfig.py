@@ -0,0 +1,107 @@
+from __future__ import absolute_import
+
+import os
+import threading
+
+from .diff import update
+from .fetch import fetch_all, merge
+from .sources import _parse_sources_str, parse_sources
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+class LazyConfig(Mapping):
+    """
+    Read only mapping of the merged sources, which are only fetched on first
+    access. Iterating or taking the length fetches every source.
+
+    ``manifest`` optionally maps source urls to the keys they provide. Key
+    lookups then only fetch the sources that may provide the key, starting
+    from the last one since it takes precedence. Sources missing from the
+    manifest may provide any key.
+
+    ``key_policy`` is the snagsby.keys.KeyPolicy sanitizing the sources, the
+    manifest lists the keys it produces.
+    """
+
+    def __init__(self, source=None, manifest=None, max_workers=None,
+                 options=None, cache=None, deadline=None, hedge=False,
+                 key_policy=None):
+        if source is None:
+            source = os.environ.get('SNAGSBY_SOURCE', '')
+        self.urls = _parse_sources_str(source)
+        self.manifest = {
+            url: frozenset(keys) for url, keys in (manifest or {}).items()
+        }
+        self.fetch_kwargs = {
+            'max_workers': max_workers,
+            'cache': cache,
+            'deadline': deadline,
+            'hedge': hedge,
+        }
+        self.options = options
+        self.key_policy = key_policy
+        self._fetched = {}
+        self._data = None
+        self._lock = threading.RLock()
+
+    @property
+    def resolved(self):
+        return self._data is not None
+
+    def _fetch(self, urls):
+        urls = [url for url in urls if url not in self._fetched]
+        if not urls:
+            return
+        parsed_sources = parse_sources(
+            ",".join(urls), defaults=self.options, key_policy=self.key_policy)
+        fetched = fetch_all(parsed_sources, **self.fetch_kwargs)
+        self._fetched.update(zip(urls, fetched))
+
+    def _resolve(self):
+        with self._lock:
+            if self._data is None:
+                self._fetch(self.urls)
+                self._data = merge(self._fetched[url] for url in self.urls)
+        return self._data
+
+    def _may_provide(self, url, key):
+        keys = self.manifest.get(url)
+        return keys is None or key in keys
+
+    def __getitem__(self, key):
+        if self._data is not None or not self.manifest:
+            return self._resolve()[key]
+
+        with self._lock:
+            for url in reversed(self.urls):
+                if not self._may_provide(url, key):
+                    continue
+                self._fetch([url])
+                data = self._fetched[url]
+                if key in data:
+                    return data[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._resolve())
+
+    def __len__(self):
+        return len(self._resolve())
+
+    def load(self, dest=None, prune=False):
+        """
+        Loads every source into dest, os.environ by default, like
+        snagsby.load(), returning a snagsby.diff.Diff.
+        """
+        if dest is None:
+            dest = os.environ
+        return update(dest, self._resolve(), prune=prune)
+
+    def __repr__(self):
+        if self._data is None:
+            return '<LazyConfig {!r} (unresolved)>'.format(",".join(self.urls))
+        return '<LazyConfig {!r}>'.format(self._data)
@@ -0,0 +1,195 @@
+from __future__ import absolute_import
+
+import copy
+import logging
+import threading
+import time
+
+from . import instrumentation
+from .exceptions import CircuitOpenError
+from .fetch import fetch_source
+
+logger = logging.getLogger(__name__)
+
+# Seconds the last good result of a source is served as is, after which it is
+# served stale while being refreshed in the background
+DEFAULT_MAX_AGE = 60
+# Consecutive failures opening the circuit of a source, and seconds it stays
+# open before a request is let through again
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_COOLDOWN = 30
+
+STALE_REVALIDATING = 'revalidating'
+STALE_CIRCUIT_OPEN = 'circuit_open'
+STALE_ERROR = 'error'
+
+
+class CircuitBreaker(object):
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 cooldown=DEFAULT_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self):
+        """
+        True while the circuit is open. Once the cooldown is over a request
+        is let through, and a single failure opens the circuit again.
+        """
+        return (
+            self.opened_at is not None
+            and time.time() < self.opened_at + self.cooldown
+        )
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.time()
+
+
+class _LastGood(object):
+    def __init__(self, data):
+        self.data = data
+        self.fetched_at = time.time()
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_at
+
+
+class Resilience(object):
+    """
+    Keeps the last good result of each source so get() can serve it rather
+    than wait on AWS:
+
+    - results younger than ``max_age`` are served without fetching
+    - older results are served stale while refreshed in the background
+    - sources failing ``failure_threshold`` times in a row have their circuit
+      opened for ``cooldown`` seconds, during which their last good result is
+      served, or CircuitOpenError raised when there is none
+    - sources reporting an error (like SMSource returning no data) serve
+      their last good result instead of wiping the configuration
+
+    Stale results are reported with snagsby.instrumentation stale events,
+    carrying the source url, the age of the result and the reason.
+    """
+
+    def __init__(self, max_age=DEFAULT_MAX_AGE,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 cooldown=DEFAULT_COOLDOWN):
+        self.max_age = max_age
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._last_good = {}
+        self._breakers = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get_breaker(self, key):
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(
+                    self.failure_threshold, self.cooldown)
+            return breaker
+
+    def _emit_stale(self, parsed_source, last_good, reason):
+        logger.debug(
+            "Serving stale %s (%s)", parsed_source.url.geturl(), reason)
+        instrumentation.emit(instrumentation.Event(
+            instrumentation.STALE_EVENT,
+            url=parsed_source.url.geturl(),
+            scheme=parsed_source.url.scheme,
+            age=last_good.age,
+            reason=reason,
+        ))
+
+    def get_stale(self, parsed_source):
+        """
+        Returns the data to serve in place of fetching the source, or None
+        when it should be fetched.
+        """
+        key = parsed_source.cache_key
+        last_good = self._last_good.get(key)
+        if self.get_breaker(key).is_open:
+            if last_good is None:
+                raise CircuitOpenError([parsed_source.url.geturl()])
+            self._emit_stale(parsed_source, last_good, STALE_CIRCUIT_OPEN)
+            return last_good.data
+
+        if last_good is None:
+            return None
+        if last_good.age >= self.max_age:
+            self.refresh(parsed_source)
+            self._emit_stale(parsed_source, last_good, STALE_REVALIDATING)
+        return last_good.data
+
+    def call(self, parsed_source, fetch):
+        """
+        Fetches the source with ``fetch``, recording the result or failure.
+        """
+        key = parsed_source.cache_key
+        breaker = self.get_breaker(key)
+        try:
+            data = fetch()
+        except Exception:
+            breaker.record_failure()
+            raise
+
+        if parsed_source.error is not None:
+            breaker.record_failure()
+            last_good = self._last_good.get(key)
+            if last_good is None:
+                return data
+            self._emit_stale(parsed_source, last_good, STALE_ERROR)
+            return last_good.data
+
+        breaker.record_success()
+        self._last_good[key] = _LastGood(data)
+        return data
+
+    def refresh(self, parsed_source):
+        """
+        Fetches the source again in a background thread, unless it already
+        is being refreshed. The fetch runs on a copy of the source, which the
+        caller keeps reading.
+        """
+        key = parsed_source.cache_key
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        refreshed_source = copy.copy(parsed_source)
+        refreshed_source.stats = {}
+        refreshed_source.error = None
+        refreshed_source.resilience = self
+
+        def run():
+            try:
+                fetch_source(refreshed_source)
+            except Exception as e:
+                logger.warning(
+                    "Unable to refresh %s: %s", parsed_source.url.geturl(), e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        thread = threading.Thread(target=run, name='snagsby-revalidate')
+        thread.daemon = True
+        thread.start()
+
+    def reset(self):
+        with self._lock:
+            self._last_good.clear()
+            self._breakers.clear()
+
+
+# Used by get(..., resilience=True)
+resilience = Resilience()
@@ -0,0 +1,225 @@
+from __future__ import absolute_import
+
+import json
+import logging
+import os
+import socket
+import threading
+
+from .exceptions import SidecarError, UntrustedSidecarError
+from .watcher import DEFAULT_INTERVAL, Watcher
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+logger = logging.getLogger(__name__)
+
+SOCKET_ENV = 'SNAGSBY_SIDECAR'
+
+# Seconds a client waits on the sidecar before fetching the sources itself.
+# The first request for a source waits on the sidecar fetching it.
+DEFAULT_TIMEOUT = 5.0
+
+
+def default_socket_path():
+    """
+    Returns $SNAGSBY_SIDECAR, or snagsby.sock in the private
+    $XDG_RUNTIME_DIR, None when neither is set. The temp directory isn't
+    used since any user could create the socket there first.
+    """
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'snagsby.sock')
+    return None
+
+
+def _encode(message):
+    return (json.dumps(message) + '\n').encode('utf-8')
+
+
+def request(path, source, options=None, timeout=DEFAULT_TIMEOUT):
+    """
+    Asks the sidecar listening on the unix socket ``path`` for the sanitized
+    data of ``source``. The protocol is one json object per line, a
+    {"source": ..., "options": {...}} request answered by {"data": {...}} or
+    {"error": "..."}. Raises socket.error, OSError or ValueError when the
+    sidecar is unavailable, UntrustedSidecarError when the socket isn't owned
+    by the current user and SidecarError when it failed to fetch the sources.
+    """
+    if os.stat(path).st_uid != os.getuid():
+        raise UntrustedSidecarError(
+            "Snagsby sidecar socket {} is owned by another user".format(path))
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(_encode({'source': source, 'options': options or {}}))
+        line = sock.makefile('rb').readline()
+    finally:
+        sock.close()
+
+    response = json.loads(line.decode('utf-8'))
+    if 'error' in response:
+        raise SidecarError(response['error'])
+    return response['data']
+
+
+def get_from_sidecar(path, source, options=None, timeout=DEFAULT_TIMEOUT):
+    """
+    Like request() but returns None when the sidecar is unavailable,
+    untrusted or failed to fetch the sources, so they are fetched directly.
+    """
+    try:
+        return request(path, source, options=options, timeout=timeout)
+    except UntrustedSidecarError as e:
+        logger.warning("Ignoring snagsby sidecar: %s", e)
+        return None
+    except SidecarError as e:
+        logger.debug("Snagsby sidecar failed to fetch %s: %s", source, e)
+        return None
+    except (socket.error, OSError, ValueError) as e:
+        logger.debug("Snagsby sidecar unavailable at %s: %s", path, e)
+        return None
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in iter(self.rfile.readline, b''):
+            self.wfile.write(self.server.sidecar.handle_request(line))
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # The socket serves secrets, only its owner may connect
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.server_bind(self)
+        finally:
+            os.umask(umask)
+
+
+class SidecarServer(object):
+    """
+    Serves sanitized sources over a unix socket to the processes of a host,
+    so they don't each fetch them from AWS. Each distinct source is fetched
+    on its first request then refreshed every ``interval`` seconds by a
+    snagsby.watcher.Watcher, failed refreshes keep serving the last data.
+    Extra keyword arguments are passed to snagsby.get().
+
+    ``path`` defaults to default_socket_path(), SidecarError is raised when
+    there is none.
+    """
+
+    def __init__(self, path=None, interval=DEFAULT_INTERVAL, **get_kwargs):
+        self.path = path or default_socket_path()
+        if not self.path:
+            raise SidecarError(
+                "No sidecar socket path, pass one or set {} or "
+                "XDG_RUNTIME_DIR".format(SOCKET_ENV))
+        self.interval = interval
+        self.get_kwargs = get_kwargs
+        self._watchers = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def get(self, source, options=None):
+        options = options or {}
+        key = (source, json.dumps(options, sort_keys=True))
+        with self._lock:
+            watcher = self._watchers.get(key)
+            if watcher is None:
+                watcher = self._watchers[key] = Watcher(
+                    source,
+                    {},
+                    interval=self.interval,
+                    options=options,
+                    sidecar=False,
+                    **self.get_kwargs
+                )
+                self._locks[key] = threading.Lock()
+            lock = self._locks[key]
+
+        with lock:
+            if not watcher.running:
+                try:
+                    watcher.start()
+                except Exception:
+                    with self._lock:
+                        self._watchers.pop(key, None)
+                    raise
+        return watcher.data
+
+    def handle_request(self, line):
+        try:
+            message = json.loads(line.decode('utf-8'))
+            response = {
+                'data': self.get(message['source'], message.get('options')),
+            }
+        except Exception as e:
+            logger.warning("Snagsby sidecar request failed: %s", e)
+            response = {'error': str(e) or e.__class__.__name__}
+        return _encode(response)
+
+    def bind(self):
+        if os.path.exists(self.path):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+            except socket.error:
+                # Left behind by a sidecar that didn't shut down cleanly
+                os.unlink(self.path)
+            else:
+                raise SidecarError(
+                    "A sidecar is already serving {}".format(self.path))
+            finally:
+                sock.close()
+        self._server = _UnixServer(self.path, _Handler)
+        self._server.sidecar = self
+
+    def serve_forever(self):
+        if self._server is None:
+            self.bind()
+        self._server.serve_forever()
+
+    def start(self):
+        """
+        Serves from a background thread.
+        """
+        self.bind()
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name='snagsby-sidecar')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        if self._server is not None:
+            self._server.server_close()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        with self._lock:
+            watchers = list(self._watchers.values())
+            self._watchers.clear()
+        for watcher in watchers:
+            watcher.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,154 @@
+from __future__ import absolute_import
+
+import mmap
+import os
+import struct
+import tempfile
+
+from .exceptions import SnapshotError
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+# A snapshot is a header (magic, version, number of keys), an index of
+# (key offset, key length, value offset, value length) entries sorted by key,
+# then the utf-8 encoded keys and values. Offsets are from the start of the
+# file, integers are little endian.
+MAGIC = b'SNAG'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI')
+INDEX_ENTRY = struct.Struct('<IIII')
+
+# os.replace is python 3 only, os.rename is atomic on posix for python 2
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return value
+    return value.encode('utf-8')
+
+
+def dumps(data):
+    """
+    Returns the snapshot of data, a dict of strings such as the result of
+    snagsby.get().
+    """
+    items = sorted((_encode(k), _encode(v)) for k, v in data.items())
+    offset = HEADER.size + INDEX_ENTRY.size * len(items)
+
+    index = []
+    chunks = []
+    for key, value in items:
+        index.append(INDEX_ENTRY.pack(
+            offset, len(key), offset + len(key), len(value)))
+        chunks.append(key)
+        chunks.append(value)
+        offset += len(key) + len(value)
+
+    header = HEADER.pack(MAGIC, VERSION, 0, len(items))
+    return b''.join([header] + index + chunks)
+
+
+def write_snapshot(path, data):
+    """
+    Atomically writes the snapshot of data to path, with mode 0600.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    # mkstemp creates the file with mode 0600
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(dumps(data))
+        _replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+class Snapshot(Mapping):
+    """
+    Read only mapping over a memory mapped snapshot file. Values are looked
+    up with a binary search of the index and decoded on access, so opening a
+    snapshot doesn't depend on its size and its pages are shared by every
+    process mapping it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError("Empty snapshot: {}".format(path))
+
+        if len(self._mmap) < HEADER.size:
+            self.close()
+            raise SnapshotError("Truncated snapshot: {}".format(path))
+        magic, version, _, count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self.close()
+            raise SnapshotError("Not a snagsby snapshot: {}".format(path))
+        if version != VERSION:
+            self.close()
+            raise SnapshotError(
+                "Unsupported snapshot version {}: {}".format(version, path))
+        if len(self._mmap) < HEADER.size + INDEX_ENTRY.size * count:
+            self.close()
+            raise SnapshotError("Truncated snapshot: {}".format(path))
+        self._count = count
+
+    def _entry(self, i):
+        return INDEX_ENTRY.unpack_from(
+            self._mmap, HEADER.size + INDEX_ENTRY.size * i)
+
+    def _key(self, i):
+        key_offset, key_length, _, _ = self._entry(i)
+        return self._mmap[key_offset:key_offset + key_length]
+
+    def __getitem__(self, key):
+        encoded = _encode(key)
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < encoded:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count:
+            key_offset, key_length, value_offset, value_length = self._entry(lo)
+            if self._mmap[key_offset:key_offset + key_length] == encoded:
+                value = self._mmap[value_offset:value_offset + value_length]
+                return value.decode('utf-8')
+        raise KeyError(key)
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._key(i).decode('utf-8')
+
+    def __len__(self):
+        return self._count
+
+    def iter_items(self):
+        """
+        Yields every (key, value) pair in key order, faster than items()
+        which looks each key up.
+        """
+        for i in range(self._count):
+            key_offset, key_length, value_offset, value_length = self._entry(i)
+            yield (
+                self._mmap[key_offset:key_offset + key_length].decode('utf-8'),
+                self._mmap[value_offset:value_offset + value_length].decode(
+                    'utf-8'),
+            )
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -2,18 +2,23 @@ from __future__ import absolute_import
 
 import json
 import logging
+import math
 import re
-
-import boto3
-import botocore
-from botocore.client import Config
-
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .cache import CacheEntry
+from .fetch import DEFAULT_MAX_WORKERS, concurrent_map, fetch_all, merge
+from .keys import DEFAULT_KEY_POLICY, KEY_REGEX  # noqa
 from .registry import Registry
 
 try:
-    from urlparse import urlparse, parse_qs
+    from urlparse import urlparse, urlunparse, parse_qs
+    from urllib import urlencode
 except ImportError:
-    from urllib.parse import urlparse, parse_qs
+    from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
 
 # Python 3 raises json.decoder.JSONDecodeError while python 2 raises ValueError
 # and doesn't provide json.decoder.JSONDecodeError.
@@ -27,27 +32,95 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 SPLITTER = re.compile(r'[\s|,]+')
-KEY_REGEX = re.compile(r'^\w+$')
 
 
-def sanitize(obj):
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+# Source options that are passed through to botocore.client.Config, mapped to
+# the function converting them from their string form in the source url.
+CLIENT_CONFIG_OPTIONS = {
+    'max_pool_connections': int,
+    'connect_timeout': float,
+    'read_timeout': float,
+    'tcp_keepalive': _to_bool,
+}
+
+# Lower bound for the request timeouts derived from SnagsbySource.timeout
+MIN_TIMEOUT = 1
+
+# boto3 and botocore are imported when a source is first fetched rather than
+# at module import time, since importing them is slow and most users of the
+# package (the cli --version, formatters, load_object) never need them.
+
+# Sessions and clients are shared by every source for the life of the
+# process so credentials, endpoints and connections are only set up once.
+_sessions = {}
+_clients = {}
+_clients_lock = threading.RLock()
+
+
+def _cache_key(opts):
+    return tuple(sorted((opts or {}).items()))
+
+
+def get_session(**opts):
+    """
+    Returns a boto3 session shared by all callers using the same options.
+    """
+    import boto3
+
+    key = _cache_key(opts)
+    with _clients_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = boto3.Session(**opts)
+        return session
+
+
+def get_client(service, session_opts=None, config_opts=None):
+    """
+    Returns a boto3 client shared by all callers using the same service,
+    session options (region, profile) and botocore config options.
+    """
+    from botocore.client import Config
+
+    key = (service, _cache_key(session_opts), _cache_key(config_opts))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            session = get_session(**(session_opts or {}))
+            config = Config(**config_opts) if config_opts else None
+            client = _clients[key] = session.client(service, config=config)
+        return client
+
+
+def reset_clients():
+    """
+    Drops every shared session and client, for instance after a fork.
+    """
+    with _clients_lock:
+        _sessions.clear()
+        _clients.clear()
+
+
+def sanitize_items(items, policy=None):
+    """
+    Builds the sanitized mapping from an iterable of (key, value) pairs,
+    normalizing and filtering keys with a snagsby.keys.KeyPolicy.
+    """
     out = {}
 
-    if not type(obj) is dict:
-        return out
-
-    for k, v in obj.items():
-        k = k.upper()
-
-        item_is_invalid = (
-            not KEY_REGEX.match(k)
-            or type(v) is dict
-            or k == 'SNAGSBY_SOURCE'
-        )
-        if item_is_invalid:
+    for k, v in (policy or DEFAULT_KEY_POLICY).normalize_items(items):
+        value_type = type(v)
+        if value_type is str:
+            out[k] = v
+        elif value_type is dict:
             continue
-
-        if type(v) is bool:
+        elif value_type is bool:
             out[k] = "1" if v else "0"
         else:
             out[k] = str(v)
@@ -55,22 +128,164 @@ def sanitize(obj):
     return out
 
 
+def sanitize(obj, policy=None):
+    if not type(obj) is dict:
+        return {}
+
+    return sanitize_items(obj.items(), policy)
+
+
+def iter_json_items(fp, policy=None):
+    """
+    Incrementally parses the JSON object read from the file object fp and
+    yields its top level (key, value) pairs, using ijson. Nested objects and
+    keys rejected by the policy are skipped without being built, and nothing
+    is yielded when the document isn't an object.
+    """
+    import ijson
+    from ijson.common import ObjectBuilder
+
+    normalize = (policy or DEFAULT_KEY_POLICY).normalize
+
+    events = ijson.basic_parse(fp, use_float=True)
+    event, value = next(events, (None, None))
+    if event != 'start_map':
+        return
+
+    key = None
+    for event, value in events:
+        if event == 'end_map':
+            return
+        if event == 'map_key':
+            key = value
+            continue
+
+        if event not in ('start_map', 'start_array'):
+            if normalize(key) is not None:
+                yield key, value
+            continue
+
+        # Only arrays of valid keys are built, objects are dropped anyway
+        builder = None
+        if event == 'start_array' and normalize(key) is not None:
+            builder = ObjectBuilder()
+        depth = 0
+        while True:
+            if builder is not None:
+                builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+                if not depth:
+                    break
+            event, value = next(events)
+        if builder is not None:
+            yield key, builder.value
+
+
 class SnagsbySource(object):
-    def __init__(self, url):
+    # Seconds left for the source to be fetched, set when get() is called
+    # with a deadline. Sources should bound their requests with it.
+    timeout = None
+    # snagsby.keys.KeyPolicy used to sanitize the data, the default if None
+    key_policy = None
+    # snagsby.resilience.Resilience recording the fetches, set by get()
+    resilience = None
+    # Error a source handled by returning partial or no data, so it isn't
+    # mistaken for a good result
+    error = None
+
+    def __init__(self, url, defaults=None):
         self.url = urlparse(url)
+        self.defaults = defaults or {}
+        # Timings (network_time, parse_time, sanitize_time) and bytes of the
+        # last fetch, reported through snagsby.instrumentation
+        self.stats = {}
+
+    @contextmanager
+    def timer(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.stats[name] = self.stats.get(name, 0) + time.time() - start
 
     @property
     def options(self):
-        return {
+        options = dict(self.defaults)
+        options.update({
             k: v[0]
             for k, v in parse_qs(self.url.query).items()
-        }
+        })
+        return options
+
+    def get_option_list(self, name):
+        """
+        Returns every value of an option repeated in the url query string,
+        falling back to the default (a single value or a list).
+        """
+        values = parse_qs(self.url.query).get(name)
+        if values:
+            return values
+        default = self.defaults.get(name)
+        if default is None:
+            return []
+        if isinstance(default, (list, tuple)):
+            return list(default)
+        return [default]
+
+    @property
+    def cache_key(self):
+        """
+        Identifies the source and its effective options, regardless of the
+        order of the query options or whether they came from defaults.
+        Every value of repeated options is included, as well as the
+        key_policy when it isn't the default one.
+        """
+        names = set(self.defaults) | set(parse_qs(self.url.query))
+        options = sorted(
+            (name, str(value))
+            for name in names
+            for value in self.get_option_list(name)
+        )
+        if (self.key_policy is not None
+                and self.key_policy.cache_key != DEFAULT_KEY_POLICY.cache_key):
+            options.append(('key_policy', self.key_policy.cache_key))
+        return "{}://{}{}?{}".format(
+            self.url.scheme,
+            self.url.netloc,
+            self.url.path,
+            urlencode(options),
+        )
+
+    @classmethod
+    def prefetch(cls, sources):
+        """
+        Called with every source of this type about to be fetched by get(),
+        so types able to fetch several sources in one request can do so.
+        """
 
     def get_raw_data(self):
         raise NotImplementedError("Please implement get_raw_data")
 
+    def get_cache_meta(self):
+        """
+        Metadata persisted alongside the source data in a cache, such as
+        validators used to revalidate the data later on.
+        """
+        return {}
+
+    def restore_cache_meta(self, meta, data):
+        """
+        Called with the metadata and data of an expired cache entry before
+        the source is fetched again.
+        """
+
     def get_data(self):
-        return sanitize(self.get_raw_data())
+        raw = self.get_raw_data()
+        with self.timer('sanitize_time'):
+            return sanitize(raw, self.key_policy)
 
 
 class AWSSource(SnagsbySource):
@@ -78,38 +293,260 @@ class AWSSource(SnagsbySource):
     def region_name(self):
         return self.options.get('region')
 
-    def get_boto3_session(self, opts=None):
-        if not opts:
-            opts = {}
+    @property
+    def profile_name(self):
+        return self.options.get('profile')
+
+    @property
+    def session_options(self):
+        opts = {}
         if self.region_name:
             opts['region_name'] = self.region_name
+        if self.profile_name:
+            opts['profile_name'] = self.profile_name
+        return opts
+
+    @property
+    def client_config_options(self):
+        options = self.options
+        config_options = {
+            k: convert(options[k])
+            for k, convert in CLIENT_CONFIG_OPTIONS.items()
+            if k in options
+        }
+        if self.timeout is not None:
+            # Whole seconds keep the number of distinct shared clients small
+            timeout = max(MIN_TIMEOUT, int(math.ceil(self.timeout)))
+            for name in ('connect_timeout', 'read_timeout'):
+                config_options[name] = min(
+                    config_options.get(name, timeout), timeout)
+        return config_options
+
+    def get_boto3_session(self, opts=None):
+        session_opts = self.session_options
+        session_opts.update(opts or {})
+        return get_session(**session_opts)
+
+    def get_client(self, service):
+        return get_client(
+            service,
+            session_opts=self.session_options,
+            config_opts=self.client_config_options,
+        )
+
+
+# BatchGetSecretValue accepts at most this many secret ids per request
+SM_BATCH_SIZE = 20
+
+# Number of parsed secrets kept by the process, and seconds they are served
+# before their version is checked again
+SM_CACHE_SIZE = 256
+SM_CACHE_TTL = 60
+
+
+class SecretCache(object):
+    """
+    LRU of the secrets parsed by this process along with their version id.
+    Fresh entries are served as is, expired ones are only downloaded again
+    when the secret's AWSCURRENT version changed. A maxsize of 0 disables it.
+    """
+
+    def __init__(self, maxsize=SM_CACHE_SIZE, ttl=SM_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def set(self, key, data, version_id=None):
+        if self.maxsize <= 0:
+            return
+        entry = CacheEntry(
+            data, time.time() + self.ttl, {'version_id': version_id})
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
 
-        return boto3.Session(**opts)
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+secret_cache = SecretCache()
+
+
+def _log_sm_error(key, code, error):
+    if code == 'ResourceNotFoundException':
+        logger.debug("The requested secret " + key + " was not found")
+    elif code == 'InvalidRequestException':
+        logger.error("The request was invalid due to: %s", error)
+    elif code == 'InvalidParameterException':
+        logger.error("The request had invalid params: %s", error)
 
 
 class SMSource(AWSSource):
+    _prefetched = None
+
+    @property
+    def secret_id(self):
+        return "{}{}".format(self.url.netloc, self.url.path)
+
+    @property
+    def secret_cache_key(self):
+        return (self.secret_id, _cache_key(self.session_options))
+
+    @classmethod
+    def prefetch(cls, sources):
+        """
+        Fetches secrets sharing a region, profile and client config through
+        BatchGetSecretValue, falling back to individual requests when that
+        isn't possible.
+        """
+        groups = OrderedDict()
+        for source in sources:
+            entry = secret_cache.get(source.secret_cache_key)
+            if entry is not None and entry.fresh:
+                continue
+            key = (
+                _cache_key(source.session_options),
+                _cache_key(source.client_config_options),
+            )
+            groups.setdefault(key, []).append(source)
+
+        for group in groups.values():
+            by_id = OrderedDict()
+            for source in group:
+                by_id.setdefault(source.secret_id, []).append(source)
+            # A single secret is cheaper to fetch the regular way
+            if len(by_id) < 2:
+                continue
+            client = group[0].get_client('secretsmanager')
+            if not hasattr(client, 'batch_get_secret_value'):
+                continue
+            secret_ids = list(by_id.keys())
+            for i in range(0, len(secret_ids), SM_BATCH_SIZE):
+                cls._batch_get(client, secret_ids[i:i + SM_BATCH_SIZE], by_id)
+
+    @classmethod
+    def _batch_get(cls, client, secret_ids, by_id):
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        responses = {}
+        errors = {}
+        params = {'SecretIdList': secret_ids}
+        try:
+            while True:
+                response = client.batch_get_secret_value(**params)
+                for value in response.get('SecretValues', []):
+                    responses[value.get('Name')] = value
+                    responses[value.get('ARN')] = value
+                for error in response.get('Errors', []):
+                    _log_sm_error(
+                        error['SecretId'],
+                        error.get('ErrorCode'),
+                        error.get('Message'),
+                    )
+                    responses[error['SecretId']] = {}
+                    errors[error['SecretId']] = error.get('ErrorCode')
+                if not response.get('NextToken'):
+                    break
+                params['NextToken'] = response['NextToken']
+        except (BotoCoreError, ClientError) as e:
+            # Missing permissions for instance, secrets are fetched one by one
+            logger.debug("Unable to batch get secrets: %s", e)
+            return
+
+        for secret_id in secret_ids:
+            if secret_id in responses:
+                for source in by_id[secret_id]:
+                    source._prefetched = responses[secret_id]
+                    source.error = errors.get(secret_id)
+
     def get_sm_response(self):
-        key = "{}{}".format(self.url.netloc, self.url.path)
-        client = self.get_boto3_session().client('secretsmanager')
+        from botocore.exceptions import ClientError
+
+        if self._prefetched is not None:
+            return self._prefetched
+
+        key = self.secret_id
+        client = self.get_client('secretsmanager')
 
         try:
             return client.get_secret_value(SecretId=key)
-        except botocore.exceptions.ClientError as e:
-            if e.response['Error']['Code'] == 'ResourceNotFoundException':
-                logger.debug("The requested secret " + key + " was not found")
-            elif e.response['Error']['Code'] == 'InvalidRequestException':
-                logger.error("The request was invalid due to: %s", e)
-            elif e.response['Error']['Code'] == 'InvalidParameterException':
-                logger.error("The request had invalid params: %s", e)
+        except ClientError as e:
+            _log_sm_error(key, e.response['Error']['Code'], e)
+            self.error = e
             return {}
 
+    def get_current_version(self):
+        """
+        Returns the version id of the AWSCURRENT version of the secret, or
+        None when it can't be described.
+        """
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        client = self.get_client('secretsmanager')
+        try:
+            response = client.describe_secret(SecretId=self.secret_id)
+        except (BotoCoreError, ClientError) as e:
+            logger.debug("Unable to describe secret %s: %s", self.secret_id, e)
+            return None
+        for version_id, stages in response.get(
+                'VersionIdsToStages', {}).items():
+            if 'AWSCURRENT' in stages:
+                return version_id
+        return None
+
+    def get_cached_data(self):
+        """
+        Returns the parsed secret from the process wide secret_cache when
+        it's fresh or its version didn't change, None otherwise.
+        """
+        entry = secret_cache.get(self.secret_cache_key)
+        if entry is None:
+            return None
+        if entry.fresh:
+            return entry.data
+
+        version_id = entry.meta.get('version_id')
+        # A prefetched secret is already downloaded, no need to check it
+        if version_id is None or self._prefetched is not None:
+            return None
+        with self.timer('network_time'):
+            current_version_id = self.get_current_version()
+        if current_version_id != version_id:
+            return None
+        secret_cache.set(self.secret_cache_key, entry.data, version_id)
+        return entry.data
+
     def get_raw_data(self):
-        response = self.get_sm_response()
+        data = self.get_cached_data()
+        if data is not None:
+            return data
+
+        with self.timer('network_time'):
+            response = self.get_sm_response()
         if 'SecretString' in response:
+            self.stats['bytes'] = len(response['SecretString'])
             try:
-                return json.loads(response['SecretString'])
+                with self.timer('parse_time'):
+                    data = json.loads(response['SecretString'])
             except JSONDecodeError:
                 return {}
+            secret_cache.set(
+                self.secret_cache_key, data, response.get('VersionId'))
+            return data
         else:
             logger.debug('Response for key {}{} does not contain SecretString'.format(
                 self.url.netloc,
@@ -118,7 +555,56 @@ class SMSource(AWSSource):
         return {}
 
 
+class _NotModified(Exception):
+    pass
+
+
+# Number of S3 objects whose ETag and sanitized data are kept by the process
+S3_ETAG_CACHE_SIZE = 256
+
+
+class ETagCache(object):
+    """
+    LRU of the ETag and sanitized data of the S3 objects fetched by this
+    process, by source cache_key, so unchanged objects are neither
+    downloaded nor parsed again. A maxsize of 0 disables it.
+    """
+
+    def __init__(self, maxsize=S3_ETAG_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def set(self, key, etag, data):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (etag, data)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+etag_cache = ETagCache()
+
+
 class S3Source(AWSSource):
+    etag = None
+
     @property
     def bucket(self):
         return self.url.netloc
@@ -127,30 +613,327 @@ class S3Source(AWSSource):
     def key(self):
         return self.url.path.lstrip("/")
 
+    @property
+    def is_prefix(self):
+        """
+        s3://bucket/prefix/ sources load every object under the prefix.
+        """
+        return not self.key or self.key.endswith('/')
+
+    @property
+    def suffix(self):
+        return self.options.get('suffix', '.json')
+
+    @property
+    def max_workers(self):
+        return int(self.options.get('max_workers', DEFAULT_MAX_WORKERS))
+
+    def list_keys(self):
+        """
+        Lists the keys under the prefix ending with the suffix, sorted.
+        """
+        paginator = self.get_client('s3').get_paginator('list_objects_v2')
+        keys = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.key):
+            for obj in page.get('Contents', []):
+                if obj['Key'].endswith(self.suffix):
+                    keys.append(obj['Key'])
+        return sorted(keys)
+
+    def get_object_source(self, key):
+        url = urlunparse((
+            self.url.scheme, self.bucket, '/' + key, '', self.url.query, ''))
+        source = S3Source(url, defaults=self.defaults)
+        source.key_policy = self.key_policy
+        source.timeout = self.timeout
+        return source
+
+    def get_prefix_data(self):
+        """
+        Fetches the objects under the prefix concurrently and merges them in
+        key order, so later keys override earlier ones.
+        """
+        object_sources = [self.get_object_source(k) for k in self.list_keys()]
+        return merge(concurrent_map(
+            lambda source: source.get_data(),
+            object_sources,
+            max_workers=self.max_workers,
+        ))
+
+    def _get_previous(self):
+        return etag_cache.get(self.cache_key)
+
+    def _set_previous(self, etag, data):
+        etag_cache.set(self.cache_key, etag, data)
+
     def get_s3_object(self):
-        s3 = self.get_boto3_session().resource('s3')
-        bucket = s3.Bucket(self.bucket)
-        return bucket.Object(self.key).get()
+        from botocore.exceptions import ClientError
+
+        s3 = self.get_client('s3')
+        params = {'Bucket': self.bucket, 'Key': self.key}
+        previous = self._get_previous()
+        if previous:
+            params['IfNoneMatch'] = previous[0]
+
+        try:
+            response = s3.get_object(**params)
+        except ClientError as e:
+            not_modified = (
+                e.response['Error']['Code'] in ('304', 'NotModified')
+            )
+            if previous and not_modified:
+                raise _NotModified()
+            raise
+
+        self.etag = response.get('ETag')
+        return response
+
+    def open_s3_object_body(self, response):
+        """
+        Returns a file like object reading the body of a get_object response,
+        decompressed incrementally when the object is compressed.
+        """
+        from .compression import open_body
+
+        body, _ = open_body(
+            response['Body'],
+            content_encoding=response.get('ContentEncoding'),
+            content_type=response.get('ContentType'),
+            key=self.key,
+        )
+        return body
 
     def get_s3_object_body(self):
-        return self.get_s3_object()['Body'].read()
+        response = self.get_s3_object()
+        # Bytes transferred, before any decompression
+        self.stats['bytes'] = response.get('ContentLength')
+        return self.open_s3_object_body(response).read()
+
+    @property
+    def stream(self):
+        return _to_bool(self.options.get('stream', False))
+
+    def get_streamed_data(self):
+        with self.timer('network_time'):
+            response = self.get_s3_object()
+        self.stats['bytes'] = response.get('ContentLength')
+        # Reading, parsing and sanitizing are interleaved when streaming
+        with self.timer('parse_time'):
+            return sanitize_items(
+                iter_json_items(
+                    self.open_s3_object_body(response), self.key_policy),
+                self.key_policy,
+            )
+
+    def get_data(self):
+        if self.is_prefix:
+            return self.get_prefix_data()
+
+        stream = self.stream
+        if stream:
+            try:
+                import ijson  # noqa
+            except ImportError:
+                logger.warning(
+                    "ijson is required to stream %s", self.url.geturl())
+                stream = False
+
+        try:
+            if stream:
+                data = self.get_streamed_data()
+            else:
+                data = super(S3Source, self).get_data()
+        except _NotModified:
+            # The object hasn't changed, reuse what was sanitized last time
+            return self._get_previous()[1]
+        if self.etag:
+            self._set_previous(self.etag, data)
+        return data
 
     def get_raw_data(self):
-        obj = self.get_s3_object_body()
-        return json.loads(obj.decode())
+        if self.is_prefix:
+            return self.get_prefix_data()
+
+        with self.timer('network_time'):
+            obj = self.get_s3_object_body()
+        if self.stats.get('bytes') is None:
+            self.stats['bytes'] = len(obj)
+        with self.timer('parse_time'):
+            return json.loads(obj.decode())
+
+    def get_cache_meta(self):
+        previous = self._get_previous()
+        return {'etag': previous[0]} if previous else {}
+
+    def restore_cache_meta(self, meta, data):
+        if meta.get('etag') and not self._get_previous():
+            self._set_previous(meta['etag'], data)
+
+
+# GetParameters accepts at most this many names per request
+SSM_BATCH_SIZE = 10
+
+
+class SSMSource(AWSSource):
+    """
+    Reads SSM Parameter Store parameters. ssm://app/config/ reads every
+    parameter under /app/config/ (recursively with the recursive option),
+    while ssm://?name=/app/one&name=/app/two reads the named parameters.
+    Parameters are decrypted unless the decrypt option is false.
+    """
+
+    @property
+    def path(self):
+        return "/{}{}".format(self.url.netloc, self.url.path)
+
+    @property
+    def names(self):
+        return self.get_option_list('name')
+
+    @property
+    def recursive(self):
+        return _to_bool(self.options.get('recursive', False))
+
+    @property
+    def decrypt(self):
+        return _to_bool(self.options.get('decrypt', True))
+
+    def get_parameters_by_path(self):
+        paginator = self.get_client('ssm').get_paginator(
+            'get_parameters_by_path')
+        pages = paginator.paginate(
+            Path=self.path,
+            Recursive=self.recursive,
+            WithDecryption=self.decrypt,
+        )
+        for page in pages:
+            for parameter in page.get('Parameters', []):
+                yield parameter
+
+    def get_parameters(self):
+        client = self.get_client('ssm')
+        names = self.names
+        for i in range(0, len(names), SSM_BATCH_SIZE):
+            response = client.get_parameters(
+                Names=names[i:i + SSM_BATCH_SIZE],
+                WithDecryption=self.decrypt,
+            )
+            for name in response.get('InvalidParameters', []):
+                logger.debug("The requested parameter " + name
+                             + " was not found")
+            for parameter in response.get('Parameters', []):
+                yield parameter
+
+    def get_key(self, name):
+        """
+        Maps a parameter name to a key: its path relative to the requested
+        path with / replaced by _, or its last segment for named parameters.
+        """
+        if self.names:
+            return name.rstrip('/').rsplit('/', 1)[-1]
+        prefix = self.path.rstrip('/') + '/'
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+        return name.strip('/').replace('/', '_')
+
+    def get_raw_data(self):
+        if self.names:
+            parameters = self.get_parameters()
+        else:
+            parameters = self.get_parameters_by_path()
+        with self.timer('network_time'):
+            return {
+                self.get_key(parameter['Name']): parameter['Value']
+                for parameter in parameters
+            }
+
+
+class SidecarSource(SnagsbySource):
+    """
+    Reads sources from a ``snagsby serve`` daemon, e.g.
+    sidecar:///run/snagsby.sock?source=s3%3A%2F%2Fbucket%2Fconfig.json where
+    the source option holds the url encoded sources. The sources are fetched
+    directly, with the other options as defaults, when the daemon is
+    unavailable.
+    """
+
+    @property
+    def socket_path(self):
+        return self.url.path
+
+    @property
+    def source(self):
+        return self.options.get('source', '')
+
+    @property
+    def source_options(self):
+        options = self.options
+        options.pop('source', None)
+        return options
+
+    def get_data(self):
+        from .sidecar import DEFAULT_TIMEOUT, get_from_sidecar
+
+        with self.timer('network_time'):
+            # The daemon sanitizes with the default key policy
+            data = None
+            if self.key_policy is None:
+                data = get_from_sidecar(
+                    self.socket_path,
+                    self.source,
+                    options=self.source_options,
+                    timeout=min(
+                        self.timeout or DEFAULT_TIMEOUT, DEFAULT_TIMEOUT),
+                )
+        if data is None:
+            parsed_sources = parse_sources(
+                self.source,
+                defaults=self.source_options,
+                key_policy=self.key_policy,
+            )
+            for parsed_source in parsed_sources:
+                parsed_source.timeout = self.timeout
+            data = merge(fetch_all(parsed_sources))
+        return data
+
+
+class SnapshotSource(SnagsbySource):
+    """
+    Reads a snapshot written by snagsby.snapshot.write_snapshot, e.g.
+    snapshot:///var/run/app/config.snap. The data was sanitized before being
+    written so it is returned as is.
+    """
+
+    @property
+    def path(self):
+        return self.url.netloc + self.url.path
+
+    def get_data(self):
+        from .snapshot import Snapshot
+
+        with self.timer('parse_time'):
+            with Snapshot(self.path) as snapshot:
+                return dict(snapshot.iter_items())
 
 
 registry = Registry()
 registry.register_handler('s3', S3Source)
 registry.register_handler('sm', SMSource)
+registry.register_handler('ssm', SSMSource)
+registry.register_handler('sidecar', SidecarSource)
+registry.register_handler('snapshot', SnapshotSource)
 
 
-def get_source(source):
+def get_source(source, defaults=None, key_policy=None):
     source_type = urlparse(source).scheme
     try:
-        return registry.get_handler(source_type)(source)
+        handler = registry.get_handler(source_type)
     except KeyError:
         return None
+    parsed_source = handler(source, defaults=defaults)
+    if key_policy is not None:
+        parsed_source.key_policy = key_policy
+    return parsed_source
 
 
 def _parse_sources_str(sources_str):
@@ -160,8 +943,8 @@ def _parse_sources_str(sources_str):
     ]
 
 
-def parse_sources(sources_str):
+def parse_sources(sources_str, defaults=None, key_policy=None):
     return [
-        get_source(source)
+        get_source(source, defaults=defaults, key_policy=key_policy)
         for source in _parse_sources_str(sources_str)
     ]
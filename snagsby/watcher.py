@@ -0,0 +1,112 @@
+from __future__ import absolute_import
+
+import logging
+import os
+import random
+import threading
+
+from .diff import diff
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 60
+DEFAULT_JITTER = 0.1
+
+
+class Watcher(object):
+    """
+    Periodically refetches sources in a background thread, applies the keys
+    that changed or disappeared to ``dest`` and calls the registered callbacks
+    with the Diff. Extra keyword arguments are passed to snagsby.get().
+    """
+
+    def __init__(self, source=None, dest=None, interval=DEFAULT_INTERVAL,
+                 jitter=DEFAULT_JITTER, callbacks=None, **get_kwargs):
+        if dest is None:
+            dest = os.environ
+        self.source = source
+        self.dest = dest
+        self.interval = interval
+        self.jitter = jitter
+        self.get_kwargs = get_kwargs
+        self.callbacks = list(callbacks or [])
+        self.data = {}
+        # Data of each source url from the last refresh, kept for the sources
+        # reporting an error on the next one
+        self._results = {}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+        return callback
+
+    def _get_delay(self):
+        spread = self.interval * self.jitter
+        return max(0, self.interval + random.uniform(-spread, spread))
+
+    def refresh(self):
+        """
+        Fetches the sources once, returning the Diff against the last result.
+        Sources reporting an error keep their previous data, so their keys
+        aren't removed, while changes of the other sources are applied.
+        """
+        from . import _get
+        from .fetch import merge
+
+        data, fetched = _get(self.source, **self.get_kwargs)
+        results = []
+        for url, source_data, error in fetched:
+            if error is not None:
+                logger.warning(
+                    "Keeping the previous data of %s after: %s", url, error)
+                source_data = self._results.get(url, source_data)
+            results.append((url, source_data))
+        if any(error is not None for _, _, error in fetched):
+            data = merge(source_data for _, source_data in results)
+        self._results = dict(results)
+
+        changes = diff(self.data, data)
+        self.data = data
+        if changes:
+            changes.apply(self.dest)
+            for callback in self.callbacks:
+                try:
+                    callback(changes)
+                except Exception:
+                    logger.exception("Snagsby watch callback failed")
+        return changes
+
+    def _run(self):
+        while not self._stopped.wait(self._get_delay()):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Snagsby watch refresh failed")
+
+    def start(self):
+        """
+        Loads the sources once then keeps refreshing them in the background.
+        """
+        self.refresh()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='snagsby-watch')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
@@ -4,7 +4,12 @@ import os
 
 import unittest
 
+from botocore.stub import Stubber
 from httpretty import HTTPretty
+from mock import patch
+
+from snagsby import sources
+from snagsby.sources import etag_cache, secret_cache
 
 
 class TestCase(unittest.TestCase):
@@ -17,5 +22,28 @@ class TestCase(unittest.TestCase):
         HTTPretty.enable()
 
     def setUp(self):
-        if 'SNAGSBY_SOURCE' in os.environ:
-            os.environ.pop('SNAGSBY_SOURCE')
+        secret_cache.clear()
+        etag_cache.clear()
+        for name in ('SNAGSBY_SOURCE', 'SNAGSBY_SIDECAR'):
+            if name in os.environ:
+                os.environ.pop(name)
+
+
+class StubbedClientTestCase(TestCase):
+    """
+    Serves every client of the sources from a botocore Stubber of the
+    ``service`` client, available as ``self.stubber``.
+    """
+    service = None
+
+    def setUp(self):
+        super(StubbedClientTestCase, self).setUp()
+        self.client = sources.get_session(
+            region_name='us-west-1').client(self.service)
+        self.stubber = Stubber(self.client)
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+        patcher = patch.object(
+            sources.AWSSource, 'get_client', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
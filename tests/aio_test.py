@@ -0,0 +1,122 @@
+from __future__ import absolute_import
+
+import threading
+import time
+import unittest
+
+import shutil
+import tempfile
+
+from botocore.stub import Stubber
+from mock import patch
+
+import snagsby
+import snagsby.sources
+from snagsby.cache import FileCache
+from snagsby.exceptions import DeadlineExceededError
+
+from . import TestCase
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+
+class NativeSource(snagsby.sources.SnagsbySource):
+    def aget_raw_data(self):
+        future = asyncio.get_event_loop().create_future()
+        future.set_result({'native': self.url.netloc})
+        return future
+
+
+@unittest.skipIf(asyncio is None, 'asyncio is not available')
+class AsyncGetTests(TestCase):
+    def setUp(self):
+        super(AsyncGetTests, self).setUp()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        snagsby.sources.registry.register_handler('native', NativeSource)
+
+    def tearDown(self):
+        snagsby.sources.registry._registery.pop('native')
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def _run(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_get_defaults_to_empty_obj(self):
+        self.assertEqual(self._run(snagsby.aget()), {})
+
+    def test_error_results_are_not_cached(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        client = snagsby.sources.get_session(
+            region_name='us-west-1').client('secretsmanager')
+        stubber = Stubber(client)
+        stubber.add_client_error(
+            'get_secret_value', service_error_code='ThrottlingException')
+        stubber.add_response('get_secret_value', {
+            'SecretString': '{"db": "x"}',
+        }, {'SecretId': 'app/secret'})
+        stubber.activate()
+        self.addCleanup(stubber.deactivate)
+        cache = FileCache(directory)
+
+        with patch.object(snagsby.sources.SMSource, 'get_client',
+                          return_value=client):
+            self.assertEqual(
+                self._run(snagsby.aget('sm://app/secret', cache=cache)), {})
+            self.assertEqual(
+                self._run(snagsby.aget('sm://app/secret', cache=cache)),
+                {'DB': 'x'})
+        stubber.assert_no_pending_responses()
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data', autospec=True)
+    def test_get_merges_in_order(self, mock):
+        def get_raw_data(source):
+            if source.key == 'one.json':
+                time.sleep(0.05)
+            return {'name': source.key}
+        mock.side_effect = get_raw_data
+        out = self._run(snagsby.aget('s3://dummy/one.json s3://dummy/two.json'))
+        self.assertEqual(out, {'NAME': 'two.json'})
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data', autospec=True)
+    def test_sync_sources_do_not_block_the_loop(self, mock):
+        loop_thread = threading.current_thread()
+        threads = []
+
+        def get_raw_data(source):
+            threads.append(threading.current_thread())
+            return {}
+        mock.side_effect = get_raw_data
+        self._run(snagsby.aget('s3://dummy/one.json'))
+        self.assertNotIn(loop_thread, threads)
+
+    def test_native_async_sources(self):
+        out = self._run(snagsby.aget('native://first native://second'))
+        self.assertEqual(out, {'NATIVE': 'second'})
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_load(self, mock):
+        mock.return_value = {'test': 'config'}
+        out = {}
+        self._run(snagsby.aload('s3://dummy/config.json', dest=out))
+        self.assertEqual(out, {'TEST': 'config'})
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data', autospec=True)
+    def test_deadline(self, mock):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def get_raw_data(source):
+            if source.key == 'slow.json':
+                release.wait(5)
+            return {}
+        mock.side_effect = get_raw_data
+        with self.assertRaises(DeadlineExceededError) as ctx:
+            self._run(snagsby.aget(
+                's3://dummy/fast.json s3://dummy/slow.json', deadline=0.1))
+        self.assertEqual(ctx.exception.sources, ['s3://dummy/slow.json'])
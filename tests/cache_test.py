@@ -0,0 +1,152 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from botocore.stub import Stubber
+from mock import patch
+
+import snagsby
+import snagsby.sources
+from snagsby.cache import FileCache
+from snagsby.exceptions import CacheError
+
+from . import TestCase
+
+try:
+    from cryptography.fernet import Fernet
+except ImportError:
+    Fernet = None
+
+
+class FileCacheTests(TestCase):
+    url = 's3://bucket/config.json?'
+
+    def setUp(self):
+        super(FileCacheTests, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_miss(self):
+        cache = FileCache(self.directory)
+        self.assertIsNone(cache.get(self.url))
+
+    def test_set_and_get(self):
+        cache = FileCache(self.directory)
+        cache.set(self.url, {'HELLO': 'world'}, meta={'etag': '"abc"'})
+        entry = cache.get(self.url)
+        self.assertTrue(entry.fresh)
+        self.assertEqual(entry.data, {'HELLO': 'world'})
+        self.assertEqual(entry.meta, {'etag': '"abc"'})
+
+    def test_entries_expire(self):
+        cache = FileCache(self.directory, ttl=-1)
+        cache.set(self.url, {'HELLO': 'world'})
+        entry = cache.get(self.url)
+        self.assertFalse(entry.fresh)
+        self.assertEqual(entry.data, {'HELLO': 'world'})
+
+    def test_entries_are_private(self):
+        cache = FileCache(os.path.join(self.directory, 'nested'))
+        cache.set(self.url, {'HELLO': 'world'})
+        mode = os.stat(cache._path(self.url)).st_mode
+        self.assertEqual(stat.S_IMODE(mode), 0o600)
+
+    def test_corrupt_entry_is_a_miss(self):
+        cache = FileCache(self.directory)
+        with open(cache._path(self.url), 'wb') as f:
+            f.write(b'not json')
+        self.assertIsNone(cache.get(self.url))
+
+    @unittest.skipIf(Fernet is None, 'cryptography is not installed')
+    def test_encrypted_entries(self):
+        key = Fernet.generate_key()
+        cache = FileCache(self.directory, key=key)
+        cache.set(self.url, {'SECRET': 'value'})
+        with open(cache._path(self.url), 'rb') as f:
+            self.assertNotIn(b'value', f.read())
+        self.assertEqual(cache.get(self.url).data, {'SECRET': 'value'})
+
+        # Entries written with another key are ignored
+        other = FileCache(self.directory, key=Fernet.generate_key())
+        self.assertIsNone(other.get(self.url))
+
+    @unittest.skipIf(Fernet is None, 'cryptography is not installed')
+    def test_key_from_environment(self):
+        key = Fernet.generate_key().decode()
+        with patch.dict(os.environ, {'SNAGSBY_CACHE_KEY': key}):
+            cache = FileCache(self.directory)
+        self.assertIsNotNone(cache._fernet)
+
+    def test_invalid_key_raises_cache_error(self):
+        with self.assertRaises(CacheError):
+            FileCache(self.directory, key='not-a-key')
+
+
+class GetWithCacheTests(TestCase):
+    def setUp(self):
+        super(GetWithCacheTests, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_fresh_entries_skip_the_network(self, mock):
+        mock.return_value = {'test': 'config'}
+        cache = FileCache(self.directory)
+        source = 's3://bucket/config.json'
+
+        self.assertEqual(snagsby.get(source, cache=cache), {'TEST': 'config'})
+        self.assertEqual(snagsby.get(source, cache=cache), {'TEST': 'config'})
+        self.assertEqual(mock.call_count, 1)
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_expired_entries_are_refetched(self, mock):
+        mock.return_value = {'test': 'config'}
+        cache = FileCache(self.directory, ttl=-1)
+        source = 's3://bucket/config.json'
+
+        snagsby.get(source, cache=cache)
+        mock.return_value = {'test': 'updated'}
+        self.assertEqual(snagsby.get(source, cache=cache), {'TEST': 'updated'})
+        self.assertEqual(mock.call_count, 2)
+
+    @patch.object(snagsby.sources.S3Source, 'get_cache_meta')
+    @patch.object(snagsby.sources.S3Source, 'restore_cache_meta')
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_expired_entries_are_revalidated(self, mock, restore, meta):
+        mock.return_value = {'test': 'config'}
+        meta.return_value = {'etag': '"v1"'}
+        cache = FileCache(self.directory, ttl=-1)
+        source = 's3://bucket/config.json'
+
+        snagsby.get(source, cache=cache)
+        self.assertFalse(restore.called)
+        snagsby.get(source, cache=cache)
+        restore.assert_called_once_with({'etag': '"v1"'}, {'TEST': 'config'})
+
+    def test_error_results_are_not_cached(self):
+        client = snagsby.sources.get_session(
+            region_name='us-west-1').client('secretsmanager')
+        stubber = Stubber(client)
+        stubber.add_client_error(
+            'get_secret_value', service_error_code='ThrottlingException')
+        stubber.add_response('get_secret_value', {
+            'SecretString': '{"db": "x"}',
+        }, {'SecretId': 'app/secret'})
+        stubber.activate()
+        self.addCleanup(stubber.deactivate)
+        cache = FileCache(self.directory)
+
+        with patch.object(snagsby.sources.SMSource, 'get_client',
+                          return_value=client):
+            self.assertEqual(snagsby.get('sm://app/secret', cache=cache), {})
+            self.assertEqual(
+                snagsby.get('sm://app/secret', cache=cache), {'DB': 'x'})
+        stubber.assert_no_pending_responses()
@@ -1,6 +1,11 @@
 from __future__ import absolute_import
 
-from snagsby.cli import SnagsbyCli
+import os
+
+from mock import patch
+
+from snagsby.cache import DEFAULT_TTL
+from snagsby.cli import SnagsbyCli, exec_main, serve_main
 
 from . import TestCase
 
@@ -15,3 +20,112 @@ class SnagsbyCliTests(TestCase):
         cli = SnagsbyCli()
         self.assertIsNone(cli._build_source_from_arg(False))
         self.assertIsNone(cli._build_source_from_arg(''))
+
+    @patch('snagsby.cli.snagsby_get')
+    def test_get_data_passes_max_workers(self, mock):
+        mock.return_value = {}
+        cli = SnagsbyCli()
+        cli.get_data(['s3://bucket/one.json'], max_workers=3)
+        mock.assert_called_once_with(
+            source='s3://bucket/one.json',
+            max_workers=3,
+        )
+
+    @patch('snagsby.cli.snagsby_get')
+    def test_main_passes_options(self, mock):
+        mock.return_value = {}
+        cli = SnagsbyCli()
+        cli.main({
+            'source': ['s3://bucket/one.json'],
+            'output': 'json',
+            'workers': None,
+            'deadline': 2.5,
+            'hedge': True,
+        })
+        mock.assert_called_once_with(
+            source='s3://bucket/one.json',
+            max_workers=None,
+            cache=None,
+            deadline=2.5,
+            hedge=True,
+            key_policy=None,
+        )
+
+    @patch('snagsby.cli.snagsby_get')
+    def test_exec_key_case(self, get):
+        get.return_value = {}
+        with patch('snagsby.cli.os.execvpe'):
+            exec_main(['s3://bucket/one.json', '--key-case', 'lower', '--',
+                       'true'])
+        key_policy = get.call_args[1]['key_policy']
+        self.assertEqual(key_policy.case, 'lower')
+
+    def test_get_cache_requires_cache_dir(self):
+        cli = SnagsbyCli()
+        self.assertIsNone(cli.get_cache({'cache_dir': None}))
+        cache = cli.get_cache({'cache_dir': '/tmp/snagsby', 'cache_ttl': 60})
+        self.assertEqual(cache.directory, '/tmp/snagsby')
+        self.assertEqual(cache.ttl, 60)
+        cache = cli.get_cache({'cache_dir': '/tmp/snagsby', 'cache_ttl': 0})
+        self.assertEqual(cache.ttl, 0)
+        cache = cli.get_cache({'cache_dir': '/tmp/snagsby'})
+        self.assertEqual(cache.ttl, DEFAULT_TTL)
+
+    @patch('snagsby.sidecar.SidecarServer')
+    def test_serve(self, mock):
+        self.assertEqual(serve_main(['--socket', '/tmp/x.sock', '-i', '30']), 0)
+        mock.assert_called_once_with(
+            path='/tmp/x.sock',
+            interval=30,
+            max_workers=None,
+            deadline=None,
+        )
+        mock.return_value.serve_forever.assert_called_once_with()
+        mock.return_value.close.assert_called_once_with()
+
+    @patch('snagsby.sidecar.SidecarServer')
+    def test_serve_default_socket(self, mock):
+        with patch.dict('os.environ', {'XDG_RUNTIME_DIR': '/run/user/1000'}):
+            serve_main([])
+        self.assertEqual(
+            mock.call_args[1]['path'], '/run/user/1000/snagsby.sock')
+
+    @patch('snagsby.sidecar.SidecarServer')
+    def test_serve_requires_socket(self, mock):
+        with patch.dict('os.environ'):
+            os.environ.pop('XDG_RUNTIME_DIR', None)
+            with patch('sys.stderr'):
+                with self.assertRaises(SystemExit):
+                    serve_main([])
+        self.assertFalse(mock.called)
+
+    @patch('snagsby.cli.os.execvpe')
+    @patch('snagsby.cli.snagsby_get')
+    def test_exec(self, get, execvpe):
+        get.return_value = {'CHARLES': '"Boz" $HOME `Dickens`'}
+        with patch.dict('os.environ', {'CHARLES': 'old', 'KEPT': '1'}):
+            exec_main([
+                's3://bucket/one.json', '-w', '2', '--',
+                'python', '-c', 'print(1)', '--',
+            ])
+        get.assert_called_once_with(
+            source='s3://bucket/one.json',
+            max_workers=2,
+            cache=None,
+            deadline=None,
+            hedge=False,
+            key_policy=None,
+        )
+        command, args, env = execvpe.call_args[0]
+        self.assertEqual(command, 'python')
+        self.assertEqual(args, ['python', '-c', 'print(1)', '--'])
+        self.assertEqual(env['CHARLES'], '"Boz" $HOME `Dickens`')
+        self.assertEqual(env['KEPT'], '1')
+
+    @patch('snagsby.cli.snagsby_get')
+    def test_exec_requires_command(self, get):
+        for argv in (['s3://bucket/one.json'], ['s3://bucket/one.json', '--']):
+            with patch('sys.stderr'):
+                with self.assertRaises(SystemExit):
+                    exec_main(argv)
+        self.assertFalse(get.called)
@@ -0,0 +1,172 @@
+from __future__ import absolute_import
+
+import bz2
+import gzip
+import io
+import json
+import unittest
+
+from mock import patch
+
+from snagsby import compression, sources
+from snagsby.exceptions import CompressionError
+
+from . import TestCase
+from .sources_test import streaming_body
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def gzip_compress(raw):
+    out = io.BytesIO()
+    with gzip.GzipFile(fileobj=out, mode='wb') as f:
+        f.write(raw)
+    return out.getvalue()
+
+
+class CountingReader(object):
+    def __init__(self, raw):
+        self.raw = io.BytesIO(raw)
+        self.reads = []
+
+    def read(self, size=-1):
+        chunk = self.raw.read(size)
+        self.reads.append(size)
+        return chunk
+
+
+class DetectTests(TestCase):
+    def test_detect(self):
+        detect = compression.detect
+        self.assertEqual(detect(content_encoding='GZIP'), 'gzip')
+        self.assertEqual(detect(content_encoding='zstd'), 'zstd')
+        self.assertEqual(
+            detect(content_type='application/x-bzip2; charset=binary'), 'bz2')
+        self.assertEqual(detect(key='config.json.zst'), 'zstd')
+        self.assertEqual(detect(head=b'\x1f\x8b\x08'), 'gzip')
+        self.assertEqual(detect(head=b'BZh9'), 'bz2')
+        self.assertEqual(
+            detect('identity', 'application/json', 'config.json', b'{"a"'),
+            None)
+        # The encoding takes precedence over the extension
+        self.assertEqual(detect('bzip2', key='config.json.gz'), 'bz2')
+
+
+class DecompressingReaderTests(TestCase):
+    raw = json.dumps({'key_{}'.format(i): i for i in range(2000)}).encode()
+
+    def test_gzip_read_in_chunks(self):
+        body = CountingReader(gzip_compress(self.raw))
+        reader = compression.DecompressingReader(body, 'gzip', chunk_size=64)
+        chunks = []
+        while True:
+            chunk = reader.read(100)
+            if not chunk:
+                break
+            self.assertLessEqual(len(chunk), 100)
+            chunks.append(chunk)
+        self.assertEqual(b''.join(chunks), self.raw)
+        self.assertTrue(all(size == 64 for size in body.reads))
+
+    def test_bz2_read_all(self):
+        reader = compression.DecompressingReader(
+            io.BytesIO(bz2.compress(self.raw)), 'bz2')
+        self.assertEqual(reader.read(), self.raw)
+        self.assertEqual(reader.read(), b'')
+
+    def test_concatenated_gzip_members(self):
+        half = len(self.raw) // 2
+        body = (
+            gzip_compress(self.raw[:half]) + gzip_compress(self.raw[half:]))
+        for chunk_size in (7, 64, len(body)):
+            reader = compression.DecompressingReader(
+                io.BytesIO(body), 'gzip', chunk_size=chunk_size)
+            self.assertEqual(reader.read(), self.raw)
+
+    def test_concatenated_bz2_streams(self):
+        half = len(self.raw) // 2
+        body = bz2.compress(self.raw[:half]) + bz2.compress(self.raw[half:])
+        for chunk_size in (7, 64, len(body)):
+            reader = compression.DecompressingReader(
+                io.BytesIO(body), 'bz2', chunk_size=chunk_size)
+            self.assertEqual(reader.read(), self.raw)
+
+    def test_gzip_zero_padding(self):
+        reader = compression.DecompressingReader(
+            io.BytesIO(gzip_compress(self.raw) + b'\x00' * 10), 'gzip')
+        self.assertEqual(reader.read(), self.raw)
+
+    def test_corrupt_data(self):
+        reader = compression.DecompressingReader(
+            io.BytesIO(b'\x1f\x8bnot really gzip'), 'gzip')
+        with self.assertRaises(CompressionError):
+            reader.read()
+
+    @unittest.skipIf(zstandard is not None, "zstandard is installed")
+    def test_zstd_requires_zstandard(self):
+        with self.assertRaises(CompressionError):
+            compression.DecompressingReader(io.BytesIO(b''), 'zstd')
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd(self):
+        raw = zstandard.ZstdCompressor().compress(self.raw)
+        body, detected = compression.open_body(io.BytesIO(raw))
+        self.assertEqual(detected, 'zstd')
+        self.assertEqual(body.read(), self.raw)
+
+    def test_open_body_uncompressed(self):
+        body, detected = compression.open_body(io.BytesIO(self.raw))
+        self.assertIsNone(detected)
+        self.assertEqual(body.read(10), self.raw[:10])
+        self.assertEqual(body.read(), self.raw[10:])
+
+
+class S3CompressedObjectTests(TestCase):
+    raw = json.dumps({'str': 'value', 'nested': {'a': 1}}).encode()
+
+    @patch.object(sources.S3Source, 'get_s3_object')
+    def test_gzip_object(self, get_s3_object):
+        get_s3_object.return_value = {
+            'Body': streaming_body(gzip_compress(self.raw)),
+            'ContentEncoding': 'gzip',
+        }
+        source = sources.S3Source("s3://bucket/file.json")
+        self.assertEqual(source.get_data(), {'STR': 'value'})
+
+    @patch.object(sources.S3Source, 'get_s3_object')
+    def test_compressed_bytes_are_reported(self, get_s3_object):
+        compressed = gzip_compress(self.raw)
+        get_s3_object.return_value = {
+            'Body': streaming_body(compressed),
+            'ContentEncoding': 'gzip',
+            'ContentLength': len(compressed),
+        }
+        source = sources.S3Source("s3://bucket/file.json")
+        source.get_data()
+        self.assertEqual(source.stats['bytes'], len(compressed))
+        self.assertNotEqual(source.stats['bytes'], len(self.raw))
+
+    @patch.object(sources.S3Source, 'get_s3_object')
+    def test_bz2_object_detected_from_extension(self, get_s3_object):
+        get_s3_object.return_value = {
+            'Body': streaming_body(bz2.compress(self.raw)),
+        }
+        source = sources.S3Source("s3://bucket/file.json.bz2")
+        self.assertEqual(source.get_data(), {'STR': 'value'})
+
+    @unittest.skipIf(ijson is None, "ijson is not installed")
+    @patch.object(sources.S3Source, 'get_s3_object')
+    def test_streamed_gzip_object(self, get_s3_object):
+        get_s3_object.return_value = {
+            'Body': streaming_body(gzip_compress(self.raw)),
+        }
+        source = sources.S3Source("s3://bucket/file.json?stream=true")
+        self.assertEqual(source.get_data(), {'STR': 'value'})
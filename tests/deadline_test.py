@@ -0,0 +1,121 @@
+from __future__ import absolute_import
+
+import shutil
+import tempfile
+import threading
+import time
+
+from mock import patch
+
+import snagsby
+import snagsby.sources
+from snagsby import deadline
+from snagsby.cache import FileCache
+from snagsby.exceptions import DeadlineExceededError, SourceError
+
+from . import TestCase
+
+
+@patch.object(deadline, 'backoff', return_value=0)
+class GetWithDeadlineTests(TestCase):
+    def setUp(self):
+        super(GetWithDeadlineTests, self).setUp()
+        self.release = threading.Event()
+
+    def tearDown(self):
+        # Lets abandoned fetches finish
+        self.release.set()
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_failures_are_retried(self, mock, backoff):
+        mock.side_effect = [ValueError("Boom"), {'test': 'config'}]
+        out = snagsby.get('s3://dummy/config.json', deadline=5)
+        self.assertEqual(out, {'TEST': 'config'})
+        self.assertEqual(mock.call_count, 2)
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_last_failure_is_raised(self, mock, backoff):
+        mock.side_effect = ValueError("Boom")
+        with self.assertRaises(ValueError):
+            snagsby.get('s3://dummy/config.json?retries=1', deadline=5)
+        self.assertEqual(mock.call_count, 2)
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data', autospec=True)
+    def test_deadline_exceeded_lists_slow_sources(self, mock, backoff):
+        def get_raw_data(source):
+            if source.key == 'slow.json':
+                self.release.wait(5)
+            return {}
+        mock.side_effect = get_raw_data
+
+        with self.assertRaises(DeadlineExceededError) as ctx:
+            snagsby.get(
+                's3://dummy/fast.json s3://dummy/slow.json', deadline=0.1)
+        self.assertEqual(ctx.exception.sources, ['s3://dummy/slow.json'])
+        self.assertIn('s3://dummy/slow.json', str(ctx.exception))
+
+    @patch.object(deadline, 'DEFAULT_HEDGE_DELAY', 0.01)
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_hedged_request_wins(self, mock, backoff):
+        calls = []
+
+        def get_raw_data():
+            calls.append(1)
+            if len(calls) == 1:
+                self.release.wait(5)
+                return {'request': 'first'}
+            return {'request': 'hedged'}
+        mock.side_effect = get_raw_data
+
+        start = time.time()
+        out = snagsby.get('s3://dummy/config.json', deadline=2, hedge=True)
+        self.assertEqual(out, {'REQUEST': 'hedged'})
+        self.assertLess(time.time() - start, 1)
+
+    @patch.object(deadline, 'DEFAULT_HEDGE_DELAY', 0.01)
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data', autospec=True)
+    def test_hedged_request_error_is_reported(self, mock, backoff):
+        calls = []
+
+        def get_raw_data(source):
+            calls.append(1)
+            if len(calls) == 1:
+                self.release.wait(5)
+                return {'request': 'first'}
+            source.error = 'ThrottlingException'
+            return {}
+        mock.side_effect = get_raw_data
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = FileCache(directory)
+        with self.assertRaises(SourceError):
+            snagsby.get('s3://dummy/config.json', deadline=3, hedge=True,
+                        raise_errors=True, cache=cache)
+        source = snagsby.sources.get_source('s3://dummy/config.json')
+        self.assertIsNone(cache.get(source.cache_key))
+
+    def test_timeout_bounds_client_config(self, backoff):
+        source = snagsby.sources.S3Source(
+            's3://dummy/config.json?connect_timeout=1')
+        source.timeout = 2.2
+        self.assertEqual(source.client_config_options, {
+            'connect_timeout': 1,
+            'read_timeout': 3,
+        })
+
+
+class LatencyTrackerTests(TestCase):
+    def test_percentile(self):
+        tracker = deadline.LatencyTracker()
+        self.assertEqual(tracker.percentile('s3', 95, default=1), 1)
+        for latency in range(1, 101):
+            tracker.record('s3', latency)
+        self.assertEqual(tracker.percentile('s3', 95), 95)
+        self.assertEqual(tracker.percentile('s3', 50), 51)
+
+    def test_samples_are_bounded(self):
+        tracker = deadline.LatencyTracker(max_samples=10)
+        for latency in range(100):
+            tracker.record('s3', latency)
+        self.assertEqual(tracker.percentile('s3', 0), 90)
@@ -0,0 +1,76 @@
+from __future__ import absolute_import
+
+from snagsby.diff import Diff, diff, update
+
+from . import TestCase
+
+
+class DiffTests(TestCase):
+    def test_diff(self):
+        out = diff(
+            {'SAME': '1', 'CHANGED': 'old', 'REMOVED': 'gone'},
+            {'SAME': '1', 'CHANGED': 'new', 'ADDED': 'here'},
+        )
+        self.assertEqual(out.added, {'ADDED': 'here'})
+        self.assertEqual(out.changed, {'CHANGED': ('old', 'new')})
+        self.assertEqual(out.removed, {'REMOVED': 'gone'})
+        self.assertEqual(out.unchanged, set(['SAME']))
+        self.assertTrue(out)
+
+    def test_no_changes_is_falsy(self):
+        out = diff({'SAME': '1'}, {'SAME': '1'})
+        self.assertFalse(out)
+        self.assertEqual(out, Diff(unchanged=set(['SAME'])))
+
+    def test_apply(self):
+        dest = {'SAME': '1', 'CHANGED': 'old', 'REMOVED': 'gone', 'OTHER': 'x'}
+        diff(
+            {'SAME': '1', 'CHANGED': 'old', 'REMOVED': 'gone'},
+            {'SAME': '1', 'CHANGED': 'new', 'ADDED': 'here'},
+        ).apply(dest)
+        self.assertEqual(dest, {
+            'SAME': '1',
+            'CHANGED': 'new',
+            'ADDED': 'here',
+            'OTHER': 'x',
+        })
+
+
+class RecordingDict(dict):
+    def __init__(self, *args, **kwargs):
+        super(RecordingDict, self).__init__(*args, **kwargs)
+        self.writes = []
+
+    def __setitem__(self, key, value):
+        self.writes.append(key)
+        super(RecordingDict, self).__setitem__(key, value)
+
+
+class UpdateTests(TestCase):
+    def test_only_changed_keys_are_written(self):
+        dest = RecordingDict({'SAME': '1', 'CHANGED': 'old'})
+        changes = update(dest, {'SAME': '1', 'CHANGED': 'new', 'NEW': 'x'})
+        self.assertEqual(sorted(dest.writes), ['CHANGED', 'NEW'])
+        self.assertEqual(changes.unchanged, set(['SAME']))
+        self.assertEqual(changes.changed, {'CHANGED': ('old', 'new')})
+        self.assertEqual(changes.added, {'NEW': 'x'})
+
+    def test_keys_are_not_removed_without_prune(self):
+        dest = {}
+        update(dest, {'ONE': '1'})
+        changes = update(dest, {'TWO': '2'})
+        self.assertEqual(dest, {'ONE': '1', 'TWO': '2'})
+        self.assertEqual(changes.removed, {})
+
+    def test_prune_removes_keys_from_previous_update(self):
+        dest = {'OTHER': 'kept'}
+        update(dest, {'ONE': '1', 'TWO': '2'}, prune=True)
+        changes = update(dest, {'TWO': '2'}, prune=True)
+        self.assertEqual(dest, {'OTHER': 'kept', 'TWO': '2'})
+        self.assertEqual(changes.removed, {'ONE': '1'})
+
+    def test_prune_only_removes_keys_it_owns(self):
+        dest = {'OTHER': 'kept'}
+        changes = update(dest, {}, prune=True)
+        self.assertEqual(dest, {'OTHER': 'kept'})
+        self.assertFalse(changes)
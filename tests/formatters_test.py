@@ -9,8 +9,23 @@ from snagsby.formatters import (EnvFormatter, JsonFormatter, get_formatter,
 
 from . import TestCase
 
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 
-class JsonFormatterTests(TestCase):
+
+class WriteToMixin(object):
+    def write(self, formatter):
+        writes = []
+        fp = StringIO()
+        write = fp.write
+        fp.write = lambda chunk: writes.append(chunk) or write(chunk)
+        formatter.write_to(fp)
+        return fp.getvalue(), writes
+
+
+class JsonFormatterTests(WriteToMixin, TestCase):
     def test_output(self):
         f = JsonFormatter({'CHARLES': 'DICKENS'})
         self.assertEqual(
@@ -20,8 +35,23 @@ class JsonFormatterTests(TestCase):
             }
         )
 
+    def test_write_to_matches_json_dumps(self):
+        data = {'B_{}'.format(i): 'v"{}\u00e9'.format(i) for i in range(25)}
+        data['A'] = '1'
+        f = JsonFormatter(data)
+        f.chunk_size = 10
+        output, writes = self.write(f)
+        self.assertEqual(output, json.dumps(data, sort_keys=True))
+        self.assertEqual(f.get_output(), output)
+        # Braces plus one write per chunk of keys
+        self.assertEqual(len(writes), 5)
+
+    def test_write_to_empty(self):
+        output, _ = self.write(JsonFormatter({}))
+        self.assertEqual(output, '{}')
+
 
-class EnvFormatterTests(TestCase):
+class EnvFormatterTests(WriteToMixin, TestCase):
     def test_env_output(self):
         f = EnvFormatter({
             'CHARLES': 'Dickens',
@@ -48,6 +78,21 @@ class EnvFormatterTests(TestCase):
         expected = 'export CHARLES="Dickens"\nexport HELLO="WORLD"'
         self.assertEqual(f.get_output(), expected)
 
+    def test_write_to_in_chunks_sorted_by_key(self):
+        f = EnvFormatter({'B': '1', 'A_B': '2', 'A': '3'})
+        f.chunk_size = 2
+        output, writes = self.write(f)
+        self.assertEqual(
+            output,
+            'export A="3"\nexport A_B="2"\nexport B="1"',
+        )
+        self.assertEqual(len(writes), 2)
+        self.assertEqual(f.get_output(), output)
+
+    def test_write_to_empty(self):
+        output, _ = self.write(EnvFormatter({}))
+        self.assertEqual(output, '')
+
 
 class EnvFactoryTests(TestCase):
     def test_missing_formatter_raises_invalid_formatter_error(self):
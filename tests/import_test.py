@@ -0,0 +1,49 @@
+from __future__ import absolute_import
+
+import subprocess
+import sys
+
+from . import TestCase
+
+
+class LazyImportTests(TestCase):
+    def _run(self, code):
+        return subprocess.check_output([sys.executable, '-c', code])
+
+    def _assert_boto3_not_imported(self, code):
+        out = self._run(
+            code + "\nimport sys\n"
+            "print(sorted(m for m in sys.modules"
+            " if m.split('.')[0] in ('boto3', 'botocore')))"
+        )
+        self.assertEqual(out.strip().splitlines()[-1], b'[]')
+
+    def test_import_snagsby_does_not_import_boto3(self):
+        self._assert_boto3_not_imported("import snagsby")
+
+    def test_import_formatters_does_not_import_boto3(self):
+        self._assert_boto3_not_imported(
+            "import snagsby.formatters\n"
+            "import snagsby.cli\n"
+            "import snagsby\n"
+            "snagsby.load_object({'a': 1}, dest={})"
+        )
+
+    def test_import_cli_does_not_import_sidecar(self):
+        out = self._run(
+            "import sys\n"
+            "import snagsby.cli\n"
+            "print('snagsby.sidecar' in sys.modules)"
+        )
+        self.assertEqual(out.strip().splitlines()[-1], b'False')
+
+    def test_cli_version_does_not_import_boto3(self):
+        self._assert_boto3_not_imported(
+            "import sys\n"
+            "from snagsby import cli\n"
+            "sys.argv = ['snagsby', '--version']\n"
+            "try:\n"
+            "    cli.main()\n"
+            "except SystemExit:\n"
+            "    pass"
+        )
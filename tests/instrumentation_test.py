@@ -0,0 +1,143 @@
+from __future__ import absolute_import
+
+from mock import Mock, patch
+from testfixtures import LogCapture
+
+import snagsby
+import snagsby.sources
+from snagsby import instrumentation
+from snagsby.cli import SnagsbyCli
+
+from . import TestCase
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        super(InstrumentationTests, self).setUp()
+        self.events = []
+        instrumentation.subscribe(self.events.append)
+
+    def tearDown(self):
+        instrumentation.unsubscribe(self.events.append)
+
+    @patch.object(snagsby.sources.S3Source, 'get_s3_object_body')
+    def test_source_and_get_events(self, mock):
+        mock.return_value = b'{"one": 1, "two": 2}'
+        snagsby.get('s3://bucket/config.json?region=us-west-1')
+
+        source, get = self.events
+        self.assertEqual(source.name, instrumentation.SOURCE_EVENT)
+        self.assertEqual(source.url, 's3://bucket/config.json?region=us-west-1')
+        self.assertEqual(source.scheme, 's3')
+        self.assertEqual(source.region, 'us-west-1')
+        self.assertEqual(source.bytes, 20)
+        self.assertEqual(source.keys, 2)
+        self.assertIsNone(source.cache)
+        for name in ('network_time', 'parse_time', 'sanitize_time'):
+            self.assertGreaterEqual(getattr(source, name), 0)
+
+        self.assertEqual(get.name, instrumentation.GET_EVENT)
+        self.assertEqual(get.sources, 1)
+        self.assertEqual(get.keys, 2)
+        self.assertGreaterEqual(get.duration, 0)
+
+    def test_unsubscribe(self):
+        instrumentation.unsubscribe(self.events.append)
+        snagsby.get('')
+        self.assertEqual(self.events, [])
+
+    def test_failing_observer_is_ignored(self):
+        observer = instrumentation.subscribe(Mock(side_effect=ValueError))
+        self.addCleanup(instrumentation.unsubscribe, observer)
+        snagsby.get('')
+        self.assertEqual(len(self.events), 1)
+
+
+class ObserverTests(TestCase):
+    source_event = instrumentation.Event(
+        instrumentation.SOURCE_EVENT,
+        url='s3://bucket/config.json',
+        scheme='s3',
+        region=None,
+        bytes=20,
+        network_time=0.01,
+        parse_time=0.002,
+        sanitize_time=None,
+        keys=2,
+        cache='miss',
+    )
+
+    def test_logging_observer(self):
+        with LogCapture() as l:
+            instrumentation.LoggingObserver()(self.source_event)
+        l.check((
+            'snagsby.instrumentation', 'INFO',
+            'Snagsby fetched s3://bucket/config.json cache=miss bytes=20 '
+            'network=10.0ms parse=2.0ms sanitize=- keys=2',
+        ))
+
+    def test_metrics_observer(self):
+        record = Mock()
+        instrumentation.MetricsObserver(record)(self.source_event)
+        labels = {'scheme': 's3', 'region': '', 'cache': 'miss'}
+        self.assertEqual(
+            [c[0] for c in record.call_args_list],
+            [
+                ('snagsby_source_network_seconds', 0.01, labels),
+                ('snagsby_source_parse_seconds', 0.002, labels),
+                ('snagsby_source_bytes', 20, labels),
+                ('snagsby_source_keys', 2, labels),
+            ],
+        )
+
+    def test_statsd_observer(self):
+        client = Mock()
+        instrumentation.StatsdObserver(client)(self.source_event)
+        client.timing.assert_any_call('snagsby.source.s3.network', 10.0)
+        client.gauge.assert_any_call('snagsby.source.s3.keys', 2)
+        client.incr.assert_called_once_with('snagsby.cache.miss')
+
+    stale_event = instrumentation.Event(
+        instrumentation.STALE_EVENT,
+        url='s3://bucket/config.json',
+        scheme='s3',
+        age=90.0,
+        reason='revalidating',
+    )
+
+    def test_stale_events(self):
+        with LogCapture() as l:
+            instrumentation.LoggingObserver()(self.stale_event)
+        l.check((
+            'snagsby.instrumentation', 'WARNING',
+            'Snagsby served stale s3://bucket/config.json (revalidating) '
+            'from 90.0s ago',
+        ))
+
+        record = Mock()
+        instrumentation.MetricsObserver(record)(self.stale_event)
+        record.assert_called_once_with(
+            'snagsby_source_stale_seconds', 90.0,
+            {'scheme': 's3', 'reason': 'revalidating'},
+        )
+
+
+class CliTimingsTests(TestCase):
+    @patch.object(snagsby.sources.S3Source, 'get_s3_object_body')
+    def test_timings_written_to_stderr(self, mock):
+        mock.return_value = b'{"one": 1}'
+        stderr = StringIO()
+        with patch('sys.stderr', stderr), patch('sys.stdout', StringIO()):
+            SnagsbyCli().main({
+                'source': ['s3://bucket/config.json'],
+                'output': 'env',
+                'timings': True,
+            })
+        out = stderr.getvalue()
+        self.assertIn('s3://bucket/config.json', out)
+        self.assertIn('total: 1 sources, 1 keys', out)
@@ -0,0 +1,123 @@
+from __future__ import absolute_import
+
+import re
+
+from snagsby import sources
+from snagsby.keys import KeyMemo, KeyPolicy
+
+from . import TestCase
+
+
+class KeyMemoTests(TestCase):
+    def test_get_and_set(self):
+        memo = KeyMemo(4)
+        self.assertIsNone(memo.get('a'))
+        memo.set('a', 'A')
+        self.assertEqual(memo.get('a'), 'A')
+
+    def test_bounded(self):
+        memo = KeyMemo(4)
+        for i in range(100):
+            memo.set(i, i)
+        self.assertLessEqual(len(memo), 8)
+
+    def test_recently_used_keys_are_kept(self):
+        memo = KeyMemo(4)
+        for i in range(4):
+            memo.set(i, i)
+        # 0 is used again, promoting it out of the old generation
+        self.assertEqual(memo.get(0), 0)
+        for i in range(4, 8):
+            memo.set(i, i)
+        self.assertEqual(memo.get(0), 0)
+        self.assertIsNone(memo.get(1))
+
+    def test_update(self):
+        memo = KeyMemo(4)
+        memo.update({'a': 'A', 'b': 'B'})
+        memo.update({'c': 'C'})
+        self.assertEqual(memo.get('a'), 'A')
+        self.assertEqual(memo.get('c'), 'C')
+        memo.update({i: i for i in range(10)})
+        self.assertEqual(memo.get(9), 9)
+
+
+class KeyPolicyTests(TestCase):
+    def test_default_policy(self):
+        policy = KeyPolicy()
+        self.assertEqual(policy.normalize('hello'), 'HELLO')
+        self.assertIsNone(policy.normalize('bad key'))
+        self.assertIsNone(policy.normalize('snagsby_source'))
+
+    def test_decisions_are_memoized(self):
+        policy = KeyPolicy()
+        policy.normalize('hello')
+        policy.normalize('bad key')
+        self.assertEqual(policy.memo.get('hello'), 'HELLO')
+        self.assertEqual(len(policy.memo), 2)
+
+    def test_normalize_items_matches_normalize(self):
+        items = [('hello', 1), ('Bad key', 2), ('snagsby_source', 3),
+                 ('World', 4)]
+        for case in ('upper', 'lower', 'preserve'):
+            expected = [
+                (KeyPolicy(case=case).normalize(k), v) for k, v in items
+                if KeyPolicy(case=case).normalize(k) is not None
+            ]
+            policy = KeyPolicy(case=case)
+            # Cold then warm memo, then partly memoized
+            self.assertEqual(list(policy.normalize_items(items)), expected)
+            self.assertEqual(len(policy.memo), 4)
+            self.assertEqual(list(policy.normalize_items(items)), expected)
+            policy.memo.clear()
+            policy.normalize('hello')
+            self.assertEqual(list(policy.normalize_items(items)), expected)
+            self.assertEqual(len(policy.memo), 4)
+
+    def test_case_modes(self):
+        self.assertEqual(KeyPolicy(case='lower').normalize('Hello'), 'hello')
+        self.assertEqual(
+            KeyPolicy(case='preserve').normalize('Hello'), 'Hello')
+        with self.assertRaises(ValueError):
+            KeyPolicy(case='title')
+
+    def test_custom_regex_and_reserved_names(self):
+        policy = KeyPolicy(
+            regex=r'^APP_\w+$', reserved=('app_secret', 'SNAGSBY_SOURCE'))
+        self.assertEqual(policy.normalize('app_name'), 'APP_NAME')
+        self.assertIsNone(policy.normalize('other'))
+        self.assertIsNone(policy.normalize('APP_SECRET'))
+
+    def test_compiled_regex(self):
+        policy = KeyPolicy(regex=re.compile(r'^[A-Z]+$'))
+        self.assertIsNone(policy.normalize('with_underscore'))
+
+    def test_cache_key(self):
+        self.assertEqual(KeyPolicy().cache_key, KeyPolicy().cache_key)
+        self.assertNotEqual(
+            KeyPolicy().cache_key, KeyPolicy(case='lower').cache_key)
+        self.assertNotEqual(
+            KeyPolicy().cache_key, KeyPolicy(reserved=()).cache_key)
+        self.assertNotEqual(
+            KeyPolicy().cache_key, KeyPolicy(regex=r'^[A-Z]+$').cache_key)
+
+    def test_source_cache_key(self):
+        source = sources.get_source('s3://dummy/config.json')
+        default_key = source.cache_key
+        source.key_policy = KeyPolicy()
+        self.assertEqual(source.cache_key, default_key)
+        source.key_policy = KeyPolicy(case='lower')
+        self.assertNotEqual(source.cache_key, default_key)
+
+    def test_sanitize_with_policy(self):
+        policy = KeyPolicy(case='lower', reserved=())
+        out = sources.sanitize({
+            'Hello': 'world',
+            'SNAGSBY_SOURCE': 's3://123',
+            'yes': True,
+        }, policy)
+        self.assertEqual(out, {
+            'hello': 'world',
+            'snagsby_source': 's3://123',
+            'yes': '1',
+        })
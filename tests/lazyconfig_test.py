@@ -0,0 +1,90 @@
+from __future__ import absolute_import
+
+from mock import patch
+
+import snagsby
+import snagsby.sources
+from snagsby.keys import KeyPolicy
+from snagsby.lazyconfig import LazyConfig
+
+from . import TestCase
+
+
+def get_raw_data(source):
+    return {
+        'one.json': {'name': 'one', 'first': '1'},
+        'two.json': {'name': 'two', 'second': '2'},
+    }[source.key]
+
+
+@patch.object(snagsby.sources.S3Source, 'get_raw_data', autospec=True,
+              side_effect=get_raw_data)
+class LazyConfigTests(TestCase):
+    source = 's3://dummy/one.json,s3://dummy/two.json'
+
+    def test_nothing_fetched_until_accessed(self, mock):
+        config = snagsby.lazy(self.source)
+        self.assertIsInstance(config, LazyConfig)
+        self.assertFalse(config.resolved)
+        self.assertIn('unresolved', repr(config))
+        self.assertEqual(mock.call_count, 0)
+
+        self.assertEqual(config['NAME'], 'two')
+        self.assertTrue(config.resolved)
+        self.assertEqual(mock.call_count, 2)
+
+    def test_iteration_resolves_every_source(self, mock):
+        config = snagsby.lazy(self.source)
+        self.assertEqual(
+            dict(config), {'NAME': 'two', 'FIRST': '1', 'SECOND': '2'})
+        self.assertEqual(len(config), 3)
+        self.assertEqual(mock.call_count, 2)
+
+    def test_key_policy(self, mock):
+        config = snagsby.lazy(self.source, key_policy=KeyPolicy(case='lower'))
+        self.assertEqual(config['name'], 'two')
+
+    def test_read_only(self, mock):
+        config = snagsby.lazy(self.source)
+        with self.assertRaises(TypeError):
+            config['NAME'] = 'three'
+
+    def test_manifest_fetches_only_providing_source(self, mock):
+        config = snagsby.lazy(self.source, manifest={
+            's3://dummy/one.json': ['NAME', 'FIRST'],
+            's3://dummy/two.json': ['NAME', 'SECOND'],
+        })
+        self.assertEqual(config['FIRST'], '1')
+        self.assertEqual(mock.call_count, 1)
+        self.assertFalse(config.resolved)
+        self.assertNotIn('MISSING', config)
+        self.assertEqual(mock.call_count, 1)
+
+        # The last source providing a key wins
+        self.assertEqual(config['NAME'], 'two')
+        self.assertEqual(mock.call_count, 2)
+        self.assertEqual(dict(config)['SECOND'], '2')
+        self.assertEqual(mock.call_count, 2)
+
+    def test_manifest_unlisted_sources_may_provide_any_key(self, mock):
+        config = snagsby.lazy(self.source, manifest={
+            's3://dummy/one.json': ['NAME', 'FIRST'],
+        })
+        self.assertEqual(config['NAME'], 'two')
+        self.assertEqual(mock.call_count, 1)
+        self.assertEqual(config['FIRST'], '1')
+        self.assertEqual(mock.call_count, 2)
+
+    def test_load(self, mock):
+        dest = {'OTHER': 'kept', 'NAME': 'old'}
+        changes = snagsby.lazy(self.source).load(dest)
+        self.assertEqual(
+            dest,
+            {'OTHER': 'kept', 'NAME': 'two', 'FIRST': '1', 'SECOND': '2'},
+        )
+        self.assertEqual(changes.changed, {'NAME': ('old', 'two')})
+
+    def test_source_defaults_to_environment(self, mock):
+        with patch.dict('os.environ', {'SNAGSBY_SOURCE': self.source}):
+            config = snagsby.lazy()
+        self.assertEqual(config['FIRST'], '1')
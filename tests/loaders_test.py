@@ -1,9 +1,14 @@
 from __future__ import absolute_import
 
+import threading
+import time
+
 from mock import patch
 
 import snagsby
 import snagsby.sources
+from snagsby.exceptions import SourceError
+from snagsby.keys import KeyPolicy
 
 from . import TestCase
 
@@ -26,6 +31,25 @@ class SnagsbyLoadTests(TestCase):
         )
         self.assertEqual(out['TEST'], 'config')
 
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_load_returns_changes(self, mock):
+        mock.return_value = {'same': '1', 'changed': 'new'}
+        out = {'SAME': '1', 'CHANGED': 'old'}
+        changes = snagsby.load(source='s3://dummy/config.json', dest=out)
+        self.assertEqual(changes.changed, {'CHANGED': ('old', 'new')})
+        self.assertEqual(changes.unchanged, set(['SAME']))
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_load_prune(self, mock):
+        out = {}
+        mock.return_value = {'one': '1', 'two': '2'}
+        snagsby.load(source='s3://dummy/config.json', dest=out, prune=True)
+        mock.return_value = {'two': '2'}
+        changes = snagsby.load(
+            source='s3://dummy/config.json', dest=out, prune=True)
+        self.assertEqual(out, {'TWO': '2'})
+        self.assertEqual(changes.removed, {'ONE': '1'})
+
 
 class SnagsbyGetTests(TestCase):
     @patch('snagsby.sanitize')
@@ -46,6 +70,128 @@ class SnagsbyGetTests(TestCase):
     def test_get_defaults_to_empty_obj(self):
         self.assertEqual(snagsby.get(), {})
 
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data', autospec=True)
+    def test_get_later_sources_override_earlier(self, mock):
+        def get_raw_data(source):
+            # The first source is the slowest to respond
+            if source.key == 'one.json':
+                time.sleep(0.05)
+            return {'name': source.key}
+        mock.side_effect = get_raw_data
+        out = snagsby.get(
+            source='s3://dummy/one.json,s3://dummy/two.json',
+        )
+        self.assertEqual(out['NAME'], 'two.json')
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data', autospec=True)
+    def test_get_fetches_sources_concurrently(self, mock):
+        second_started = threading.Event()
+
+        def get_raw_data(source):
+            if source.key == 'two.json':
+                second_started.set()
+                return {}
+            # Only completes quickly if both fetches are in flight at once
+            return {'concurrent': second_started.wait(1)}
+        mock.side_effect = get_raw_data
+        out = snagsby.get(
+            source='s3://dummy/one.json,s3://dummy/two.json',
+        )
+        self.assertEqual(out['CONCURRENT'], '1')
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data', autospec=True)
+    def test_get_single_worker_is_sequential(self, mock):
+        threads = set()
+
+        def get_raw_data(source):
+            threads.add(threading.current_thread())
+            return {}
+        mock.side_effect = get_raw_data
+        snagsby.get(
+            source='s3://dummy/one.json,s3://dummy/two.json',
+            max_workers=1,
+        )
+        self.assertEqual(threads, set([threading.current_thread()]))
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data', autospec=True)
+    def test_get_fetches_repeated_sources_once(self, mock):
+        mock.side_effect = lambda source: {
+            'name': source.key, source.key[:3]: '1'}
+        out = snagsby.get(
+            source='s3://dummy/one.json,s3://dummy/two.json,'
+                   's3://dummy/one.json',
+        )
+        self.assertEqual(mock.call_count, 2)
+        # The repeated source still overrides the one before it
+        self.assertEqual(out, {'NAME': 'one.json', 'ONE': '1', 'TWO': '1'})
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data', autospec=True)
+    def test_concurrent_gets_share_fetches(self, mock):
+        started = threading.Event()
+        release = threading.Event()
+
+        def get_raw_data(source):
+            started.set()
+            release.wait(1)
+            return {'one': '1'}
+        mock.side_effect = get_raw_data
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                snagsby.get('s3://dummy/one.json')))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        started.wait(1)
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(mock.call_count, 1)
+        self.assertEqual(results, [{'ONE': '1'}] * 3)
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_get_key_policy(self, mock):
+        mock.return_value = {'Test': 'config'}
+        self.assertEqual(
+            snagsby.get('s3://dummy/config.json'), {'TEST': 'config'})
+        # Results sanitized with another policy aren't shared
+        self.assertEqual(
+            snagsby.get('s3://dummy/config.json',
+                        key_policy=KeyPolicy(case='preserve')),
+            {'Test': 'config'})
+
+    @patch('snagsby.sidecar.get_from_sidecar')
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_custom_key_policy_skips_sidecar(self, mock, get_from_sidecar):
+        mock.return_value = {'Test': 'config'}
+        out = snagsby.get('s3://dummy/config.json', sidecar='/tmp/x.sock',
+                          key_policy=KeyPolicy(case='lower'))
+        self.assertEqual(out, {'test': 'config'})
+        self.assertFalse(get_from_sidecar.called)
+
+
+class SnagsbyGetErrorsTests(TestCase):
+    @patch.object(snagsby.sources.SMSource, 'prefetch')
+    @patch.object(snagsby.sources.SMSource, 'get_sm_response', autospec=True)
+    def test_raise_errors(self, mock, prefetch):
+        def get_sm_response(source):
+            if source.secret_id == 'app/two':
+                source.error = 'ThrottlingException'
+                return {}
+            return {'SecretString': '{"one": "1"}'}
+        mock.side_effect = get_sm_response
+        source = 'sm://app/one,sm://app/two'
+
+        self.assertEqual(snagsby.get(source), {'ONE': '1'})
+        with self.assertRaises(SourceError) as ctx:
+            snagsby.get(source, raise_errors=True)
+        self.assertEqual(
+            ctx.exception.errors, {'sm://app/two': 'ThrottlingException'})
+
 
 class SnagsbyLoadObjectTests(TestCase):
     def test_load_object_sanitizes(self):
@@ -57,3 +203,9 @@ class SnagsbyLoadObjectTests(TestCase):
         snagsby.load_object(obj, dest=out)
         self.assertEqual(out['TEST'], 'config')
         self.assertEqual(out['NUM'], '7.77')
+
+    def test_load_object_returns_changes(self):
+        out = {'TEST': 'config'}
+        changes = snagsby.load_object({'test': 'config', 'new': 1}, dest=out)
+        self.assertEqual(changes.added, {'NEW': '1'})
+        self.assertEqual(changes.unchanged, set(['TEST']))
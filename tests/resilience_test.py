@@ -0,0 +1,212 @@
+from __future__ import absolute_import
+
+import threading
+import time
+
+from mock import patch
+
+import snagsby
+import snagsby.sources
+from snagsby import instrumentation, sources
+from snagsby.exceptions import CircuitOpenError
+from snagsby.fetch import fetch_source
+from snagsby.resilience import CircuitBreaker, Resilience
+
+from . import StubbedClientTestCase, TestCase
+
+
+class CircuitBreakerTests(TestCase):
+    def test_opens_after_threshold_then_half_opens(self):
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=30)
+        breaker.record_failure()
+        self.assertFalse(breaker.is_open)
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open)
+
+        breaker.opened_at -= 31
+        self.assertFalse(breaker.is_open)
+        # A single failure of the trial request opens it again
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open)
+
+        breaker.record_success()
+        self.assertFalse(breaker.is_open)
+        self.assertEqual(breaker.failures, 0)
+
+
+class ResilienceTests(TestCase):
+    source = 's3://dummy/config.json'
+
+    def setUp(self):
+        super(ResilienceTests, self).setUp()
+        self.resilience = Resilience(
+            max_age=60, failure_threshold=2, cooldown=30)
+        self.events = []
+        instrumentation.subscribe(self.events.append)
+        self.addCleanup(instrumentation.unsubscribe, self.events.append)
+        patcher = patch.object(snagsby.sources.S3Source, 'get_raw_data')
+        self.get_raw_data = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self):
+        return snagsby.get(self.source, resilience=self.resilience)
+
+    def age(self, seconds):
+        for last_good in self.resilience._last_good.values():
+            last_good.fetched_at -= seconds
+
+    def stale_events(self):
+        return [
+            event for event in self.events
+            if event.name == instrumentation.STALE_EVENT
+        ]
+
+    def test_recent_results_are_served_without_fetching(self):
+        self.get_raw_data.return_value = {'one': '1'}
+        self.assertEqual(self.get(), {'ONE': '1'})
+        self.assertEqual(self.get(), {'ONE': '1'})
+        self.assertEqual(self.get_raw_data.call_count, 1)
+        self.assertEqual(self.stale_events(), [])
+
+    def test_stale_results_are_served_while_revalidating(self):
+        self.get_raw_data.return_value = {'one': '1'}
+        self.get()
+        self.age(61)
+
+        refreshed = threading.Event()
+
+        def get_raw_data():
+            refreshed.wait(1)
+            return {'one': '2'}
+        self.get_raw_data.side_effect = get_raw_data
+
+        start = time.time()
+        self.assertEqual(self.get(), {'ONE': '1'})
+        self.assertEqual(self.get(), {'ONE': '1'})
+        self.assertLess(time.time() - start, 0.5)
+        refreshed.set()
+        while self.resilience._refreshing:
+            time.sleep(0.01)
+
+        self.assertEqual(self.get(), {'ONE': '2'})
+        # Only one refresh while it was in flight
+        self.assertEqual(self.get_raw_data.call_count, 2)
+        event = self.stale_events()[0]
+        self.assertEqual(event.url, self.source)
+        self.assertEqual(event.reason, 'revalidating')
+        self.assertGreaterEqual(event.age, 61)
+
+    def test_refresh_does_not_modify_the_source_served_stale(self):
+        self.get_raw_data.return_value = {'one': '1'}
+        self.get()
+        self.age(61)
+
+        def get_data(source):
+            source.error = 'ThrottlingException'
+            source.stats['bytes'] = 2
+            return {}
+        parsed_source = sources.get_source(self.source)
+        with patch.object(snagsby.sources.S3Source, 'get_data',
+                          autospec=True, side_effect=get_data) as mock:
+            self.assertEqual(
+                self.resilience.get_stale(parsed_source), {'ONE': '1'})
+            while self.resilience._refreshing:
+                time.sleep(0.01)
+        self.assertEqual(mock.call_count, 1)
+        self.assertIsNone(parsed_source.error)
+        self.assertEqual(parsed_source.stats, {})
+        self.assertIsNone(parsed_source.resilience)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        self.get_raw_data.side_effect = ValueError('Throttled')
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self.get()
+        with self.assertRaises(CircuitOpenError) as ctx:
+            self.get()
+        self.assertEqual(ctx.exception.sources, [self.source])
+        self.assertEqual(self.get_raw_data.call_count, 2)
+
+    def test_open_circuit_serves_last_good(self):
+        self.get_raw_data.return_value = {'one': '1'}
+        self.get()
+        breaker = self.resilience.get_breaker(
+            sources.get_source(self.source).cache_key)
+        breaker.opened_at = time.time()
+        self.age(61)
+
+        self.assertEqual(self.get(), {'ONE': '1'})
+        self.assertEqual(self.get_raw_data.call_count, 1)
+        self.assertEqual(self.stale_events()[0].reason, 'circuit_open')
+
+    def test_deduped_sources_share_resilience(self):
+        self.get_raw_data.return_value = {'one': '1'}
+        snagsby.get(self.source + ',' + self.source, resilience=self.resilience)
+        self.assertEqual(self.get(), {'ONE': '1'})
+        self.assertEqual(self.get_raw_data.call_count, 1)
+
+
+class SMSourceResilienceTests(StubbedClientTestCase):
+    service = 'secretsmanager'
+
+    def setUp(self):
+        super(SMSourceResilienceTests, self).setUp()
+        self.resilience = Resilience()
+
+    def fetch(self):
+        source = sources.SMSource('sm://app/one')
+        source.resilience = self.resilience
+        return fetch_source(source)
+
+    def test_errors_do_not_wipe_configuration(self):
+        self.stubber.add_response('get_secret_value', {
+            'SecretString': '{"one": 1}',
+        }, {'SecretId': 'app/one'})
+        self.stubber.add_client_error(
+            'get_secret_value', service_error_code='ThrottlingException')
+
+        self.assertEqual(self.fetch(), {'ONE': '1'})
+        sources.secret_cache.clear()
+        # The throttled request returned no data, the last good is served
+        self.assertEqual(self.fetch(), {'ONE': '1'})
+        self.stubber.assert_no_pending_responses()
+        breaker, = self.resilience._breakers.values()
+        self.assertEqual(breaker.failures, 1)
+
+    @patch.object(sources.SMSource, 'get_sm_response', autospec=True)
+    def test_coalesced_errors_do_not_wipe_configuration(self, mock):
+        mock.return_value = {'SecretString': '{"db": "x"}'}
+        self.assertEqual(self.fetch(), {'DB': 'x'})
+        sources.secret_cache.clear()
+
+        release = threading.Event()
+
+        def throttled(source):
+            release.wait(1)
+            source.error = 'ThrottlingException'
+            return {}
+        mock.side_effect = throttled
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.fetch()))
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        # Gives the second fetch time to join the first one
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(mock.call_count, 2)
+        self.assertEqual(results, [{'DB': 'x'}, {'DB': 'x'}])
+        last_good, = self.resilience._last_good.values()
+        self.assertEqual(last_good.data, {'DB': 'x'})
+
+    def test_errors_without_last_good_return_no_data(self):
+        self.stubber.add_client_error(
+            'get_secret_value', service_error_code='ThrottlingException')
+        self.assertEqual(self.fetch(), {})
+        self.assertEqual(self.resilience._last_good, {})
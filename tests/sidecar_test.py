@@ -0,0 +1,167 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import socket
+import stat
+import tempfile
+
+from httpretty import HTTPretty
+from mock import patch
+
+import snagsby
+import snagsby.sources
+from snagsby.exceptions import SidecarError, UntrustedSidecarError
+from snagsby.sidecar import (SidecarServer, default_socket_path,
+                             get_from_sidecar, request)
+from snagsby.sources import SidecarSource, get_source
+
+from . import TestCase
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+
+class SidecarTests(TestCase):
+    source = 's3://dummy/config.json'
+
+    def setUp(self):
+        super(SidecarTests, self).setUp()
+        # httpretty replaces the socket module, unix sockets need the real one
+        HTTPretty.disable()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'snagsby.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        HTTPretty.enable()
+
+    def serve(self, **kwargs):
+        server = SidecarServer(self.path, **kwargs).start()
+        self.addCleanup(server.close)
+        return server
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_serves_sources_fetched_once(self, mock):
+        mock.return_value = {'one': '1'}
+        self.serve()
+        self.assertEqual(request(self.path, self.source), {'ONE': '1'})
+        self.assertEqual(request(self.path, self.source), {'ONE': '1'})
+        self.assertEqual(mock.call_count, 1)
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_options_are_passed_to_get(self, mock):
+        mock.return_value = {'one': '1'}
+        server = self.serve()
+        request(self.path, self.source, options={'region': 'us-west-2'})
+        watcher, = server._watchers.values()
+        self.assertEqual(watcher.get_kwargs['options'], {'region': 'us-west-2'})
+        self.assertIs(watcher.get_kwargs['sidecar'], False)
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_errors_are_returned(self, mock):
+        mock.side_effect = ValueError('Boom')
+        server = self.serve()
+        with self.assertRaises(SidecarError) as ctx:
+            request(self.path, self.source)
+        self.assertEqual(str(ctx.exception), 'Boom')
+        self.assertEqual(server._watchers, {})
+
+    def test_socket_only_accessible_to_owner(self):
+        self.serve()
+        mode = stat.S_IMODE(os.stat(self.path).st_mode)
+        self.assertEqual(mode, 0o600)
+
+    def test_replaces_stale_socket(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        sock.close()
+        self.serve()
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_refuses_to_replace_live_socket(self):
+        self.serve()
+        with self.assertRaises(SidecarError):
+            SidecarServer(self.path).bind()
+
+    def test_close_removes_socket(self):
+        server = SidecarServer(self.path).start()
+        server.close()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_get_from_sidecar_none_when_unavailable(self):
+        self.assertIsNone(get_from_sidecar(self.path, self.source))
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_socket_owned_by_another_user_is_not_trusted(self, mock):
+        mock.return_value = {'one': '1'}
+        self.serve()
+        with patch('snagsby.sidecar.os.getuid', return_value=os.getuid() + 1):
+            with self.assertRaises(UntrustedSidecarError):
+                request(self.path, self.source)
+            self.assertIsNone(get_from_sidecar(self.path, self.source))
+        self.assertEqual(mock.call_count, 0)
+
+    def test_default_socket_path(self):
+        with patch.dict('os.environ', {'XDG_RUNTIME_DIR': '/run/user/1000'}):
+            self.assertEqual(
+                default_socket_path(), '/run/user/1000/snagsby.sock')
+            os.environ['SNAGSBY_SIDECAR'] = self.path
+            self.assertEqual(default_socket_path(), self.path)
+        with patch.dict('os.environ'):
+            os.environ.pop('XDG_RUNTIME_DIR', None)
+            self.assertIsNone(default_socket_path())
+            with self.assertRaises(SidecarError):
+                SidecarServer()
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_get_reads_from_sidecar(self, mock):
+        mock.return_value = {'one': '1'}
+        self.serve()
+        os.environ['SNAGSBY_SIDECAR'] = self.path
+        self.addCleanup(os.environ.pop, 'SNAGSBY_SIDECAR')
+        self.assertEqual(snagsby.get(self.source), {'ONE': '1'})
+        self.assertEqual(snagsby.get(self.source), {'ONE': '1'})
+        self.assertEqual(mock.call_count, 1)
+
+    @patch.object(snagsby.sources.SMSource, 'prefetch')
+    @patch.object(snagsby.sources.SMSource, 'get_sm_response', autospec=True)
+    def test_get_with_missing_secret_matches_direct_fetch(self, mock, _):
+        def get_sm_response(source):
+            if source.secret_id == 'app/missing':
+                source.error = 'ResourceNotFoundException'
+                return {}
+            return {'SecretString': '{"a": "1"}'}
+        mock.side_effect = get_sm_response
+        self.serve()
+        source = 'sm://app/ok,sm://app/missing'
+        self.assertEqual(snagsby.get(source, sidecar=False), {'A': '1'})
+        self.assertEqual(snagsby.get(source, sidecar=self.path), {'A': '1'})
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_get_falls_back_when_sidecar_unavailable(self, mock):
+        mock.return_value = {'one': '1'}
+        self.assertEqual(
+            snagsby.get(self.source, sidecar=self.path), {'ONE': '1'})
+        self.assertEqual(mock.call_count, 1)
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_sidecar_source(self, mock):
+        mock.return_value = {'one': '1'}
+        url = 'sidecar://{}?source={}&region=us-west-2'.format(
+            self.path, quote(self.source + ',' + self.source, safe=''))
+        parsed_source = get_source(url)
+        self.assertIsInstance(parsed_source, SidecarSource)
+        self.assertEqual(parsed_source.socket_path, self.path)
+        self.assertEqual(parsed_source.source_options, {'region': 'us-west-2'})
+
+        # Fetched directly while the sidecar is down
+        self.assertEqual(parsed_source.get_data(), {'ONE': '1'})
+        self.assertEqual(mock.call_count, 1)
+
+        server = self.serve()
+        self.assertEqual(parsed_source.get_data(), {'ONE': '1'})
+        watcher, = server._watchers.values()
+        self.assertEqual(watcher.source, self.source + ',' + self.source)
@@ -0,0 +1,83 @@
+from __future__ import absolute_import
+
+import threading
+import time
+
+from snagsby.singleflight import SingleFlight
+
+from . import TestCase
+
+
+class SingleFlightTests(TestCase):
+    def run_concurrently(self, flight, key, fn, count=3):
+        results = []
+        errors = []
+
+        def call():
+            try:
+                results.append(flight.do(key, fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def test_concurrent_calls_share_result(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            release.wait(1)
+            return {'A': '1'}
+
+        threads, results, errors = self.run_concurrently(flight, 'key', fn)
+        while not flight.in_flight('key'):
+            pass
+        # Gives the other threads time to join the call
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'A': '1'}] * 3)
+        self.assertFalse(flight.in_flight('key'))
+
+    def test_concurrent_calls_share_exception(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        error = ValueError('Boom')
+
+        def fn():
+            release.wait(1)
+            raise error
+
+        threads, results, errors = self.run_concurrently(flight, 'key', fn)
+        while not flight.in_flight('key'):
+            pass
+        # Gives the other threads time to join the call
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [])
+        self.assertTrue(errors)
+        self.assertTrue(all(e is error for e in errors))
+        self.assertFalse(flight.in_flight('key'))
+
+    def test_sequential_calls_are_not_shared(self):
+        flight = SingleFlight()
+        calls = []
+        for _ in range(2):
+            flight.do('key', lambda: calls.append(1))
+        self.assertEqual(len(calls), 2)
+
+    def test_keys_are_independent(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do('a', lambda: 1), 1)
+        self.assertEqual(flight.do('b', lambda: 2), 2)
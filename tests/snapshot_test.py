@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import os
+import shutil
+import stat
+import tempfile
+
+from mock import patch
+
+import snagsby
+import snagsby.sources
+from snagsby.cli import SnagsbyCli
+from snagsby.exceptions import SnapshotError
+from snagsby.snapshot import HEADER, Snapshot, dumps, write_snapshot
+
+from . import TestCase
+
+
+class SnapshotTests(TestCase):
+    data = {
+        'ONE': '1',
+        'TWO': 'deux',
+        'UNICODE': 'caf\xe9',
+        'EMPTY': '',
+        'A_LONGER_KEY': 'x' * 1000,
+    }
+
+    def setUp(self):
+        super(SnapshotTests, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'config.snap')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, raw):
+        with open(self.path, 'wb') as f:
+            f.write(raw)
+
+    def test_round_trip(self):
+        write_snapshot(self.path, self.data)
+        with Snapshot(self.path) as snapshot:
+            self.assertEqual(len(snapshot), 5)
+            self.assertEqual(list(snapshot), sorted(self.data))
+            self.assertEqual(dict(snapshot), self.data)
+            self.assertEqual(dict(snapshot.iter_items()), self.data)
+            self.assertEqual(snapshot['UNICODE'], 'caf\xe9')
+            self.assertEqual(snapshot['EMPTY'], '')
+            self.assertNotIn('MISSING', snapshot)
+            self.assertNotIn('ON', snapshot)
+            self.assertNotIn('ZZZ', snapshot)
+            with self.assertRaises(KeyError):
+                snapshot['MISSING']
+
+    def test_empty_data(self):
+        write_snapshot(self.path, {})
+        with Snapshot(self.path) as snapshot:
+            self.assertEqual(dict(snapshot), {})
+            self.assertNotIn('ONE', snapshot)
+
+    def test_written_with_owner_only_mode(self):
+        write_snapshot(self.path, self.data)
+        mode = stat.S_IMODE(os.stat(self.path).st_mode)
+        self.assertEqual(mode, 0o600)
+        self.assertEqual(os.listdir(self.directory), ['config.snap'])
+
+    def test_invalid_files(self):
+        valid = dumps(self.data)
+        for raw in [
+            b'',
+            b'SNAG',
+            b'JSON' + valid[4:],
+            valid[:4] + b'\x02' + valid[5:],
+            valid[:HEADER.size + 4],
+        ]:
+            self.write(raw)
+            with self.assertRaises(SnapshotError):
+                Snapshot(self.path)
+
+    def test_snapshot_source(self):
+        write_snapshot(self.path, self.data)
+        self.assertEqual(
+            snagsby.get('snapshot://{}'.format(self.path)), self.data)
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_cli_write_snapshot(self, mock):
+        mock.return_value = {'one': '1'}
+        SnagsbyCli().main({
+            'source': ['s3://dummy/config.json'],
+            'output': 'env',
+            'write_snapshot': self.path,
+        })
+        with Snapshot(self.path) as snapshot:
+            self.assertEqual(dict(snapshot), {'ONE': '1'})
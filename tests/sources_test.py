@@ -1,15 +1,24 @@
 from __future__ import absolute_import
 
+import io
 import json
 import logging
 import os
+import unittest
 
+from botocore.response import StreamingBody
 from mock import patch
 from testfixtures import LogCapture, log_capture
 
+import snagsby
 from snagsby import sources
 
-from . import TestCase
+from . import StubbedClientTestCase, TestCase
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 
 class SplitSourcesTests(TestCase):
@@ -76,6 +85,48 @@ class AWSSourceTests(TestCase):
         self.assertEqual(session.region_name, 'us-east-2')
 
 
+class SharedClientTests(TestCase):
+    def setUp(self):
+        super(SharedClientTests, self).setUp()
+        sources.reset_clients()
+
+    def tearDown(self):
+        sources.reset_clients()
+
+    def test_sources_in_same_region_share_clients(self):
+        one = sources.S3Source("s3://bucket/one.json?region=us-west-1")
+        two = sources.S3Source("s3://bucket/two.json?region=us-west-1")
+        self.assertIs(one.get_client('s3'), two.get_client('s3'))
+        self.assertIs(one.get_boto3_session(), two.get_boto3_session())
+
+    def test_sources_in_different_regions_do_not_share_clients(self):
+        one = sources.S3Source("s3://bucket/one.json?region=us-west-1")
+        two = sources.S3Source("s3://bucket/two.json?region=us-east-2")
+        self.assertIsNot(one.get_client('s3'), two.get_client('s3'))
+
+    def test_client_config_options_from_url(self):
+        source = sources.S3Source(
+            "s3://bucket/one.json?region=us-west-1"
+            "&max_pool_connections=20&connect_timeout=2.5&tcp_keepalive=true"
+        )
+        self.assertEqual(source.client_config_options, {
+            'max_pool_connections': 20,
+            'connect_timeout': 2.5,
+            'tcp_keepalive': True,
+        })
+        config = source.get_client('s3').meta.config
+        self.assertEqual(config.max_pool_connections, 20)
+        self.assertEqual(config.connect_timeout, 2.5)
+
+    def test_url_options_override_defaults(self):
+        source = sources.S3Source(
+            "s3://bucket/one.json?read_timeout=5",
+            defaults={'read_timeout': 10, 'region': 'us-west-1'},
+        )
+        self.assertEqual(source.region_name, 'us-west-1')
+        self.assertEqual(source.client_config_options, {'read_timeout': 5.0})
+
+
 class S3SourceTests(TestCase):
     source = "s3://my-bucket/my/file.json?region=us-west-1"
 
@@ -106,6 +157,197 @@ class S3SourceTests(TestCase):
         })
 
 
+def streaming_body(raw):
+    return StreamingBody(io.BytesIO(raw), len(raw))
+
+
+class S3SourceRevalidationTests(StubbedClientTestCase):
+    service = 's3'
+    url = "s3://bucket/file.json?region=us-west-1"
+
+    def _add_object(self, raw, etag, if_none_match=None):
+        params = {'Bucket': 'bucket', 'Key': 'file.json'}
+        if if_none_match:
+            params['IfNoneMatch'] = if_none_match
+        self.stubber.add_response('get_object', {
+            'Body': streaming_body(raw),
+            'ETag': etag,
+        }, params)
+
+    def _add_not_modified(self, etag):
+        self.stubber.add_client_error(
+            'get_object',
+            service_error_code='304',
+            http_status_code=304,
+            expected_params={
+                'Bucket': 'bucket',
+                'Key': 'file.json',
+                'IfNoneMatch': etag,
+            },
+        )
+
+    def test_not_modified_reuses_sanitized_data(self):
+        self._add_object(b'{"HELLO": "world"}', '"v1"')
+        self._add_not_modified('"v1"')
+
+        first = sources.S3Source(self.url).get_data()
+        with patch.object(sources.json, 'loads') as loads:
+            second = sources.S3Source(self.url).get_data()
+        self.assertFalse(loads.called)
+        self.assertIs(first, second)
+        self.stubber.assert_no_pending_responses()
+
+    def test_only_sanitized_data_is_kept(self):
+        self._add_object(b'{"hello": "world", "nested": {"a": 1}}', '"v1"')
+        source = sources.S3Source(self.url)
+        source.get_data()
+        self.assertEqual(
+            sources.etag_cache.get(source.cache_key),
+            ('"v1"', {'HELLO': 'world'}))
+
+    def test_modified_object_is_downloaded(self):
+        self._add_object(b'{"HELLO": "world"}', '"v1"')
+        self._add_object(b'{"HELLO": "there"}', '"v2"', if_none_match='"v1"')
+
+        sources.S3Source(self.url).get_data()
+        source = sources.S3Source(self.url)
+        self.assertEqual(source.get_data(), {'HELLO': 'there'})
+        self.assertEqual(source.get_cache_meta(), {'etag': '"v2"'})
+
+    def test_restore_cache_meta_revalidates(self):
+        self._add_not_modified('"v1"')
+        source = sources.S3Source(self.url)
+        source.restore_cache_meta({'etag': '"v1"'}, {'HELLO': 'cached'})
+        self.assertEqual(source.get_data(), {'HELLO': 'cached'})
+
+
+class ETagCacheTests(TestCase):
+    def test_bounded_lru(self):
+        cache = sources.ETagCache(maxsize=2)
+        cache.set('one', '"1"', {})
+        cache.set('two', '"2"', {})
+        cache.get('one')
+        cache.set('three', '"3"', {})
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('two'))
+        self.assertEqual(cache.get('one'), ('"1"', {}))
+
+    def test_disabled(self):
+        cache = sources.ETagCache(maxsize=0)
+        cache.set('one', '"1"', {})
+        self.assertIsNone(cache.get('one'))
+
+
+class S3PrefixSourceTests(StubbedClientTestCase):
+    service = 's3'
+
+    def test_is_prefix(self):
+        self.assertTrue(sources.S3Source("s3://bucket/config/").is_prefix)
+        self.assertTrue(sources.S3Source("s3://bucket").is_prefix)
+        self.assertFalse(sources.S3Source("s3://bucket/a.json").is_prefix)
+
+    def test_lists_every_page(self):
+        self.stubber.add_response('list_objects_v2', {
+            'Contents': [{'Key': 'config/b.json'}, {'Key': 'config/README'}],
+            'IsTruncated': True,
+            'NextContinuationToken': 'next',
+        }, {'Bucket': 'bucket', 'Prefix': 'config/'})
+        self.stubber.add_response('list_objects_v2', {
+            'Contents': [{'Key': 'config/a.json'}],
+            'IsTruncated': False,
+        }, {'Bucket': 'bucket', 'Prefix': 'config/',
+            'ContinuationToken': 'next'})
+
+        source = sources.S3Source("s3://bucket/config/")
+        self.assertEqual(
+            source.list_keys(), ['config/a.json', 'config/b.json'])
+
+    def test_objects_are_merged_in_key_order(self):
+        self.stubber.add_response('list_objects_v2', {
+            'Contents': [{'Key': 'config/b.json'}, {'Key': 'config/a.json'}],
+        }, {'Bucket': 'bucket', 'Prefix': 'config/'})
+        for key, raw in (('config/a.json', b'{"name": "a", "a": 1}'),
+                         ('config/b.json', b'{"name": "b"}')):
+            self.stubber.add_response('get_object', {
+                'Body': streaming_body(raw),
+            }, {'Bucket': 'bucket', 'Key': key})
+
+        # A single worker keeps the stubbed responses in order
+        source = sources.S3Source("s3://bucket/config/?max_workers=1")
+        self.assertEqual(source.get_data(), {'NAME': 'b', 'A': '1'})
+        self.stubber.assert_no_pending_responses()
+
+    @patch.object(sources.S3Source, 'list_keys')
+    @patch.object(sources.S3Source, 'get_raw_data', autospec=True)
+    def test_objects_inherit_options(self, get_raw_data, list_keys):
+        list_keys.return_value = ['config/a.json']
+        get_raw_data.side_effect = lambda source: {
+            'region': source.region_name,
+            'key': source.key,
+        }
+        source = sources.S3Source("s3://bucket/config/?region=us-west-1")
+        self.assertEqual(source.get_data(), {
+            'REGION': 'us-west-1',
+            'KEY': 'config/a.json',
+        })
+
+    def test_objects_inherit_timeout(self):
+        source = sources.S3Source("s3://bucket/config/")
+        source.timeout = 2.5
+        self.assertEqual(source.get_object_source('config/a.json').timeout, 2.5)
+
+
+@unittest.skipIf(ijson is None, 'ijson is not installed')
+class StreamingTests(TestCase):
+    raw = json.dumps({
+        'str': 'value',
+        'num': 7.777,
+        'int': 42,
+        'yes': True,
+        'no': False,
+        'null': None,
+        'list': [1, 'two', {'three': 3}, [4]],
+        'nested': {'object': {'deep': [1, 2]}},
+        'bad key': 'ignored',
+        'bad key list': [1, 2],
+        'SNAGSBY_SOURCE': 's3://123',
+        'after': 'nested',
+    }).encode()
+
+    def test_matches_sanitize(self):
+        streamed = sources.sanitize_items(
+            sources.iter_json_items(io.BytesIO(self.raw)))
+        self.assertEqual(streamed, sources.sanitize(json.loads(self.raw)))
+        self.assertEqual(streamed['AFTER'], 'nested')
+        self.assertNotIn('NESTED', streamed)
+
+    def test_nested_objects_and_invalid_keys_are_skipped(self):
+        items = list(sources.iter_json_items(io.BytesIO(self.raw)))
+        keys = [k for k, _ in items]
+        self.assertNotIn('nested', keys)
+        self.assertNotIn('bad key list', keys)
+
+    def test_non_object_documents(self):
+        for raw in (b'[1, 2]', b'"string"', b'7'):
+            self.assertEqual(
+                list(sources.iter_json_items(io.BytesIO(raw))), [])
+
+    @patch.object(sources.S3Source, 'get_s3_object')
+    @patch.object(sources.S3Source, 'get_raw_data')
+    def test_s3_source_streams_when_asked(self, get_raw_data, get_s3_object):
+        get_s3_object.return_value = {'Body': streaming_body(self.raw)}
+        source = sources.S3Source("s3://bucket/file.json?stream=true")
+        out = source.get_data()
+        self.assertFalse(get_raw_data.called)
+        self.assertEqual(out['STR'], 'value')
+
+    @patch.object(sources.S3Source, 'get_raw_data')
+    def test_s3_source_does_not_stream_by_default(self, get_raw_data):
+        get_raw_data.return_value = {'str': 'value'}
+        source = sources.S3Source("s3://bucket/file.json")
+        self.assertEqual(source.get_data(), {'STR': 'value'})
+
+
 class SMSourceTests(TestCase):
     source = "sm://some/key/path?region=us-west-1"
 
@@ -134,6 +376,273 @@ class SMSourceTests(TestCase):
         )
 
 
+class SMSourceBatchTests(StubbedClientTestCase):
+    service = 'secretsmanager'
+
+    def _secret(self, name, value):
+        return {
+            'Name': name,
+            'ARN': 'arn:aws:secretsmanager:us-west-1:1:secret:' + name,
+            'SecretString': json.dumps(value),
+        }
+
+    @log_capture('snagsby')
+    def test_secrets_are_fetched_in_one_batch(self, l):
+        self.stubber.add_response('batch_get_secret_value', {
+            'SecretValues': [
+                self._secret('app/one', {'one': 1}),
+                self._secret('app/two', {'two': 2}),
+            ],
+            'Errors': [{
+                'SecretId': 'app/missing',
+                'ErrorCode': 'ResourceNotFoundException',
+                'Message': 'Not found',
+            }],
+        }, {'SecretIdList': ['app/one', 'app/two', 'app/missing']})
+
+        parsed = sources.parse_sources(
+            "sm://app/one sm://app/two sm://app/missing")
+        sources.SMSource.prefetch(parsed)
+        self.stubber.assert_no_pending_responses()
+
+        self.assertEqual(
+            [source.get_data() for source in parsed],
+            [{'ONE': '1'}, {'TWO': '2'}, {}],
+        )
+        l.check(
+            ('snagsby.sources', 'DEBUG',
+             'The requested secret app/missing was not found'),
+            ('snagsby.sources', 'DEBUG',
+             'Response for key app/missing does not contain SecretString'),
+        )
+
+    def test_batches_are_chunked(self):
+        names = ['app/{}'.format(i) for i in range(25)]
+        for chunk in (names[:20], names[20:]):
+            self.stubber.add_response('batch_get_secret_value', {
+                'SecretValues': [
+                    self._secret(name, {'name': name}) for name in chunk
+                ],
+            }, {'SecretIdList': chunk})
+
+        parsed = sources.parse_sources(
+            " ".join("sm://" + name for name in names))
+        sources.SMSource.prefetch(parsed)
+        self.stubber.assert_no_pending_responses()
+        self.assertEqual(parsed[24].get_data(), {'NAME': 'app/24'})
+
+    def test_batch_failure_falls_back_to_single_requests(self):
+        self.stubber.add_client_error(
+            'batch_get_secret_value', service_error_code='AccessDeniedException')
+        self.stubber.add_response('get_secret_value', {
+            'SecretString': '{"one": 1}',
+        }, {'SecretId': 'app/one'})
+
+        parsed = sources.parse_sources("sm://app/one sm://app/two")
+        sources.SMSource.prefetch(parsed)
+        self.assertEqual(parsed[0].get_data(), {'ONE': '1'})
+
+    def test_get_uses_batches(self):
+        self.stubber.add_response('batch_get_secret_value', {
+            'SecretValues': [
+                self._secret('app/one', {'name': 'one'}),
+                self._secret('app/two', {'name': 'two'}),
+            ],
+        }, {'SecretIdList': ['app/one', 'app/two']})
+
+        out = snagsby.get("sm://app/one sm://app/two")
+        self.assertEqual(out, {'NAME': 'two'})
+
+
+class SMSourceCacheTests(StubbedClientTestCase):
+    service = 'secretsmanager'
+
+    def add_secret(self, value, version_id):
+        self.stubber.add_response('get_secret_value', {
+            'SecretString': json.dumps(value),
+            'VersionId': version_id * 32,
+        }, {'SecretId': 'app/one'})
+
+    def add_describe(self, version_id):
+        self.stubber.add_response('describe_secret', {
+            'VersionIdsToStages': {
+                'a' * 32: ['AWSPREVIOUS'],
+                version_id * 32: ['AWSCURRENT'],
+            },
+        }, {'SecretId': 'app/one'})
+
+    def get_data(self):
+        return sources.SMSource("sm://app/one").get_data()
+
+    def expire(self):
+        for entry in sources.secret_cache._entries.values():
+            entry.expires = 0
+
+    def test_fresh_secrets_are_served_from_cache(self):
+        self.add_secret({'one': 1}, 'b')
+        self.assertEqual(self.get_data(), {'ONE': '1'})
+        self.assertEqual(self.get_data(), {'ONE': '1'})
+        self.stubber.assert_no_pending_responses()
+
+    def test_expired_secret_with_same_version_is_not_downloaded(self):
+        self.add_secret({'one': 1}, 'b')
+        self.add_describe('b')
+        self.get_data()
+        self.expire()
+        self.assertEqual(self.get_data(), {'ONE': '1'})
+        self.stubber.assert_no_pending_responses()
+        # Served again until the renewed entry expires
+        self.assertEqual(self.get_data(), {'ONE': '1'})
+
+    def test_rotated_secret_is_downloaded(self):
+        self.add_secret({'one': 1}, 'b')
+        self.add_describe('c')
+        self.add_secret({'one': 2}, 'c')
+        self.get_data()
+        self.expire()
+        self.assertEqual(self.get_data(), {'ONE': '2'})
+        self.stubber.assert_no_pending_responses()
+
+    def test_failed_describe_downloads_secret(self):
+        self.add_secret({'one': 1}, 'b')
+        self.stubber.add_client_error(
+            'describe_secret', service_error_code='AccessDeniedException')
+        self.add_secret({'one': 1}, 'b')
+        self.get_data()
+        self.expire()
+        self.assertEqual(self.get_data(), {'ONE': '1'})
+        self.stubber.assert_no_pending_responses()
+
+    def test_errors_are_not_cached(self):
+        self.stubber.add_client_error(
+            'get_secret_value', service_error_code='ResourceNotFoundException')
+        self.add_secret({'one': 1}, 'b')
+        self.assertEqual(self.get_data(), {})
+        self.assertEqual(self.get_data(), {'ONE': '1'})
+
+    def test_batches_populate_cache_and_skip_fresh_secrets(self):
+        self.stubber.add_response('batch_get_secret_value', {
+            'SecretValues': [
+                {'Name': name, 'SecretString': '{"name": "%s"}' % name,
+                 'VersionId': 'b' * 32}
+                for name in ('app/one', 'app/two')
+            ],
+        }, {'SecretIdList': ['app/one', 'app/two']})
+        self.assertEqual(
+            snagsby.get("sm://app/one sm://app/two"), {'NAME': 'app/two'})
+        self.assertEqual(
+            snagsby.get("sm://app/one sm://app/two"), {'NAME': 'app/two'})
+        self.stubber.assert_no_pending_responses()
+
+    def test_cache_is_bounded(self):
+        cache = sources.SecretCache(maxsize=2)
+        for key in ('one', 'two', 'three'):
+            cache.set(key, {})
+        cache.get('two')
+        cache.set('four', {})
+        self.assertEqual(list(cache._entries), ['two', 'four'])
+
+    def test_disabled_cache(self):
+        cache = sources.SecretCache(maxsize=0)
+        cache.set('one', {})
+        self.assertIsNone(cache.get('one'))
+
+
+class SSMSourceTests(StubbedClientTestCase):
+    service = 'ssm'
+
+    def _parameter(self, name, value):
+        return {'Name': name, 'Value': value, 'Type': 'String'}
+
+    def test_options(self):
+        source = sources.SSMSource(
+            "ssm://app/config/?recursive=true&decrypt=false")
+        self.assertEqual(source.path, '/app/config/')
+        self.assertTrue(source.recursive)
+        self.assertFalse(source.decrypt)
+        self.assertEqual(source.names, [])
+
+    def test_get_parameters_by_path(self):
+        self.stubber.add_response('get_parameters_by_path', {
+            'Parameters': [self._parameter('/app/config/db_host', 'db')],
+            'NextToken': 'next',
+        }, {'Path': '/app/config/', 'Recursive': True, 'WithDecryption': True})
+        self.stubber.add_response('get_parameters_by_path', {
+            'Parameters': [
+                self._parameter('/app/config/cache/url', 'redis://'),
+                self._parameter('/app/config/bad-key', 'ignored'),
+            ],
+        }, {'Path': '/app/config/', 'Recursive': True, 'WithDecryption': True,
+            'NextToken': 'next'})
+
+        source = sources.SSMSource("ssm://app/config/?recursive=1")
+        self.assertEqual(source.get_data(), {
+            'DB_HOST': 'db',
+            'CACHE_URL': 'redis://',
+        })
+        self.stubber.assert_no_pending_responses()
+
+    @log_capture('snagsby')
+    def test_get_parameters_in_batches(self, l):
+        names = ['/app/p{}'.format(i) for i in range(12)]
+        self.stubber.add_response('get_parameters', {
+            'Parameters': [
+                self._parameter(name, name) for name in names[:9]
+            ],
+            'InvalidParameters': ['/app/p9'],
+        }, {'Names': names[:10], 'WithDecryption': False})
+        self.stubber.add_response('get_parameters', {
+            'Parameters': [
+                self._parameter(name, name) for name in names[10:]
+            ],
+        }, {'Names': names[10:], 'WithDecryption': False})
+
+        source = sources.SSMSource("ssm://?decrypt=false&" + "&".join(
+            'name=' + name for name in names))
+        out = source.get_data()
+        self.assertEqual(out['P0'], '/app/p0')
+        self.assertEqual(out['P11'], '/app/p11')
+        self.assertNotIn('P9', out)
+        l.check(('snagsby.sources', 'DEBUG',
+                 'The requested parameter /app/p9 was not found'))
+
+    def test_names_from_defaults(self):
+        source = sources.SSMSource("ssm://", defaults={'name': ['/a', '/b']})
+        self.assertEqual(source.names, ['/a', '/b'])
+
+    def test_cache_key_includes_repeated_options(self):
+        first = sources.SSMSource("ssm://?name=/app/x&name=/app/y")
+        second = sources.SSMSource("ssm://?name=/app/x&name=/app/z")
+        self.assertNotEqual(first.cache_key, second.cache_key)
+        self.assertEqual(
+            first.cache_key,
+            sources.SSMSource("ssm://?name=/app/y&name=/app/x").cache_key)
+        self.assertEqual(
+            first.cache_key,
+            sources.SSMSource(
+                "ssm://", defaults={'name': ['/app/x', '/app/y']}).cache_key)
+
+    def test_get_sources_sharing_first_name(self):
+        self.stubber.add_response('get_parameters', {
+            'Parameters': [
+                self._parameter('/app/x', 'x'),
+                self._parameter('/app/y', 'y'),
+            ],
+        }, {'Names': ['/app/x', '/app/y'], 'WithDecryption': True})
+        self.stubber.add_response('get_parameters', {
+            'Parameters': [
+                self._parameter('/app/x', 'x'),
+                self._parameter('/app/z', 'z'),
+            ],
+        }, {'Names': ['/app/x', '/app/z'], 'WithDecryption': True})
+
+        out = snagsby.get(
+            "ssm://?name=/app/x&name=/app/y,ssm://?name=/app/x&name=/app/z",
+            max_workers=1)
+        self.assertEqual(out, {'X': 'x', 'Y': 'y', 'Z': 'z'})
+        self.stubber.assert_no_pending_responses()
+
+
 class ParseSourcesTests(TestCase):
     def test_empty_list(self):
         self.assertEqual(sources.parse_sources(""), [])
@@ -150,6 +659,15 @@ class ParseSourcesTests(TestCase):
         out = sources.parse_sources("sm://my/key/path")
         self.assertEqual(type(out[0]).__name__, 'SMSource')
 
+    def test_source_identifies_ssm(self):
+        out = sources.parse_sources("ssm://app/config/")
+        self.assertEqual(type(out[0]).__name__, 'SSMSource')
+
+    def test_defaults_are_passed_to_sources(self):
+        out = sources.parse_sources(
+            "s3://my-bucket/file.json", defaults={'region': 'us-west-1'})
+        self.assertEqual(out[0].region_name, 'us-west-1')
+
 
 class SanitizeTests(TestCase):
     def _sanitize(self, obj):
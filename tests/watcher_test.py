@@ -0,0 +1,97 @@
+from __future__ import absolute_import
+
+import threading
+
+from mock import patch
+
+import snagsby
+import snagsby.sources
+from snagsby.watcher import Watcher
+
+from . import TestCase
+
+
+class WatcherTests(TestCase):
+    source = 's3://dummy/config.json'
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_refresh_applies_changes_and_calls_callbacks(self, mock):
+        dest = {'UNRELATED': 'kept'}
+        calls = []
+        watcher = Watcher(self.source, dest, callbacks=[calls.append])
+
+        mock.return_value = {'one': '1', 'two': '2'}
+        watcher.refresh()
+        mock.return_value = {'one': '1', 'three': '3'}
+        changes = watcher.refresh()
+
+        self.assertEqual(changes.added, {'THREE': '3'})
+        self.assertEqual(changes.removed, {'TWO': '2'})
+        self.assertEqual(dest, {'UNRELATED': 'kept', 'ONE': '1', 'THREE': '3'})
+        self.assertEqual(len(calls), 2)
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_callbacks_not_called_without_changes(self, mock):
+        mock.return_value = {'one': '1'}
+        calls = []
+        watcher = Watcher(self.source, {}, callbacks=[calls.append])
+        watcher.refresh()
+        watcher.refresh()
+        self.assertEqual(len(calls), 1)
+
+    @patch.object(snagsby.sources.SMSource, 'prefetch')
+    @patch.object(snagsby.sources.SMSource, 'get_sm_response', autospec=True)
+    def test_source_errors_keep_their_keys(self, mock, prefetch):
+        dest = {}
+        calls = []
+        secrets = {'app/db': '{"db": "x"}', 'app/api': '{"api": "1"}'}
+
+        def get_sm_response(source):
+            if source.secret_id not in secrets:
+                source.error = 'ResourceNotFoundException'
+                return {}
+            return {'SecretString': secrets[source.secret_id]}
+        mock.side_effect = get_sm_response
+        watcher = Watcher('sm://app/db,sm://app/api,sm://app/missing', dest,
+                          callbacks=[calls.append])
+        watcher.refresh()
+        self.assertEqual(dest, {'DB': 'x', 'API': '1'})
+
+        # The throttled secret keeps its keys, the rotated one is applied
+        del secrets['app/db']
+        secrets['app/api'] = '{"api": "2"}'
+        snagsby.sources.secret_cache.clear()
+        changes = watcher.refresh()
+
+        self.assertEqual(changes.changed, {'API': ('1', '2')})
+        self.assertEqual(changes.removed, {})
+        self.assertEqual(dest, {'DB': 'x', 'API': '2'})
+        self.assertEqual(watcher.data, {'DB': 'x', 'API': '2'})
+        self.assertEqual(len(calls), 2)
+
+    @patch.object(snagsby.sources.S3Source, 'get_raw_data')
+    def test_failed_refresh_keeps_running(self, mock):
+        mock.return_value = {'one': '1'}
+        refreshed = threading.Event()
+        attempts = []
+
+        def get_raw_data():
+            attempts.append(1)
+            if len(attempts) == 2:
+                raise ValueError("Boom")
+            if len(attempts) == 3:
+                refreshed.set()
+            return {'one': str(len(attempts))}
+        mock.side_effect = get_raw_data
+
+        dest = {}
+        with snagsby.watch(self.source, dest, interval=0.01) as watcher:
+            self.assertTrue(watcher.running)
+            self.assertTrue(refreshed.wait(5))
+        self.assertFalse(watcher.running)
+        self.assertEqual(dest['ONE'], '3')
+
+    def test_jitter(self):
+        watcher = Watcher(self.source, {}, interval=10, jitter=0.5)
+        for _ in range(20):
+            self.assertTrue(5 <= watcher._get_delay() <= 15)